@@ -3,10 +3,47 @@ Database configuration for Prisma ORM
 """
 import os
 from contextlib import asynccontextmanager
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from prisma import Prisma
 
+from app.settings import settings
+
+
+def _default_connection_limit() -> int:
+    """
+    Default pool size per process: (cpus * 2 + 1) shared across uvicorn workers
+    """
+    cpus = os.cpu_count() or 1
+    workers = max(settings.web_concurrency, 1)
+    return max((cpus * 2 + 1) // workers, 1)
+
+
+def _build_datasource_url(base_url: str) -> str:
+    """
+    Append Prisma connection pool parameters to the database URL
+
+    Parameters already present in the URL take precedence so deployments can
+    still tune the pool through the connection string itself.
+    """
+    parts = urlsplit(base_url)
+    query = dict(parse_qsl(parts.query))
+
+    pool_params = {
+        "connection_limit": settings.db_connection_limit or _default_connection_limit(),
+        "pool_timeout": settings.db_pool_timeout,
+        "connect_timeout": settings.db_connect_timeout,
+    }
+    if settings.db_pgbouncer:
+        pool_params["pgbouncer"] = "true"
+
+    for key, value in pool_params.items():
+        query.setdefault(key, str(value))
+
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
 # Initialize Prisma client
-prisma = Prisma()
+prisma = Prisma(datasource={"url": _build_datasource_url(settings.DIRECT_URL)})
 
 @asynccontextmanager
 async def get_db():
@@ -33,4 +70,4 @@ async def disconnect_db():
     Disconnect from the database
     """
     if prisma.is_connected():
-        await prisma.disconnect() 
+        await prisma.disconnect()
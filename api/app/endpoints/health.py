@@ -1,4 +1,8 @@
+import asyncio
+import time
+from typing import Optional, Tuple
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 from datetime import datetime
 from ..schemas.common import HealthCheck
 from ..settings import settings
@@ -6,15 +10,53 @@ from app.services import openai_service
 
 router = APIRouter(prefix="/health", tags=["health"])
 
+# Static part of the health check payload, built once at import
+_HEALTHY = {"status": "healthy", "version": settings.app_version}
+
+# Probe timestamps are refreshed at most every _TIMESTAMP_TTL seconds
+_TIMESTAMP_TTL = 0.5
+_timestamp_cache: Tuple[float, datetime] = (0.0, datetime.now())
+
+# OpenAI health results are reused for a short window so frequent probes
+# collapse into a single upstream embedding request
+_OPENAI_HEALTH_TTL = 10.0
+_openai_health_cache: Optional[Tuple[float, Tuple[bool, str, int]]] = None
+_openai_health_lock = asyncio.Lock()
+
+
+async def _check_openai() -> Tuple[bool, str, int]:
+    """Return (healthy, model, dimensions) for OpenAI, cached for _OPENAI_HEALTH_TTL seconds"""
+    global _openai_health_cache
+    
+    async with _openai_health_lock:
+        if _openai_health_cache and time.monotonic() - _openai_health_cache[0] < _OPENAI_HEALTH_TTL:
+            return _openai_health_cache[1]
+        
+        healthy = await openai_service.health_check()
+        result = (healthy, openai_service.embedding_model, openai_service.embedding_dimensions)
+        _openai_health_cache = (time.monotonic(), result)
+        return result
+
+
+def _cached_now() -> datetime:
+    """Return datetime.now(), reusing the previous value within _TIMESTAMP_TTL seconds"""
+    global _timestamp_cache
+    
+    now = time.monotonic()
+    if now - _timestamp_cache[0] >= _TIMESTAMP_TTL:
+        _timestamp_cache = (now, datetime.now())
+    return _timestamp_cache[1]
+
 
 @router.get("/", response_model=HealthCheck)
 async def health_check():
-    """Health check endpoint"""
-    return HealthCheck(
-        status="healthy",
-        version=settings.app_version,
-        timestamp=datetime.now()
-    )
+    """
+    Health check endpoint
+
+    Returns a prebuilt response directly so probes skip HealthCheck
+    validation and serialization; the schema is kept for the OpenAPI docs.
+    """
+    return ORJSONResponse({**_HEALTHY, "timestamp": _cached_now()})
 
 @router.get("/services")
 async def services_health_check():
@@ -28,11 +70,11 @@ async def services_health_check():
     
     # Check OpenAI service
     try:
-        openai_healthy = await openai_service.health_check()
+        openai_healthy, model, dimensions = await _check_openai()
         health_status["services"]["openai"] = {
             "status": "healthy" if openai_healthy else "unhealthy",
-            "model": openai_service.embedding_model,
-            "dimensions": openai_service.embedding_dimensions
+            "model": model,
+            "dimensions": dimensions
         }
         
         if not openai_healthy:
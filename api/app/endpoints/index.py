@@ -1,19 +1,53 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
-import json
+from typing import Any, Dict, Optional
+import asyncio
+import weakref
 import logging
+from uuid import UUID, uuid4
+from prisma import Json
 
-from app.database import get_db
+from app.database import prisma
+from app.services.token_store import github_token_store
 from app.tasks.index import process_indexing
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Per-user locks serializing the check -> insert -> dispatch sequence so
+# concurrent /index calls from one user cannot both start an indexing task.
+# Entries disappear once no request holds the lock.
+_user_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _get_user_lock(user_id: str) -> asyncio.Lock:
+    """Get (or create) the indexing lock for a user"""
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _user_locks[user_id] = lock
+    return lock
+
+
+def _require_active_repo(profile: Optional[Dict[str, Any]]) -> None:
+    """Raise an HTTPException unless the profile has an active repo, branch and directory"""
+    if not profile:
+        raise HTTPException(status_code=404, detail="User profile not found")
+    
+    required = (
+        ("repo_id", "No active repository set for user"),
+        ("active_branch", "No active branch set for user"),
+        ("active_directory", "No active directory set for user"),
+    )
+    for field, detail in required:
+        if not profile.get(field):
+            raise HTTPException(status_code=400, detail=detail)
+
 class IndexRequest(BaseModel):
     user_id: str
     soft_reindex: bool = False
 
-@router.post("/index")
+@router.post("/index", status_code=status.HTTP_202_ACCEPTED)
 async def run_index(request: IndexRequest):
     """
     Start indexing process for user's active repository.
@@ -33,88 +67,116 @@ async def run_index(request: IndexRequest):
     if not request.user_id:
         raise HTTPException(status_code=400, detail="User ID cannot be empty")
     
-    # Get user's active repository info from database
-    async with get_db() as db:
-        profile = await db.profile.find_unique(
-            where={"id": request.user_id},
-            include={
-                "active_repo": True
-            }
+    # Reject malformed IDs before touching the database
+    try:
+        UUID(request.user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid user_id")
+    
+    async with _get_user_lock(request.user_id):
+        return await _start_indexing(request)
+
+
+async def _start_indexing(request: IndexRequest):
+    """Validate the user's active repository, dispatch the indexing task and record the job"""
+    # Look up the profile and any in-flight indexing job on a single pooled connection
+    async with prisma.tx() as tx:
+        # Only fetch the columns needed to dispatch the task
+        profile = await tx.query_first(
+            """
+            SELECT p.active_branch,
+                   p.active_directory,
+                   p.github_access_token,
+                   r.id AS repo_id,
+                   r.github_full_name
+            FROM public.profile p
+            LEFT JOIN public.repo r ON r.id = p.active_repo_id
+            WHERE p.id = $1::uuid
+            """,
+            request.user_id
         )
         
-        if not profile:
-            raise HTTPException(status_code=404, detail="User profile not found")
-        
-        if not profile.active_repo:
-            raise HTTPException(status_code=400, detail="No active repository set for user")
-        
-        if not profile.active_branch:
-            raise HTTPException(status_code=400, detail="No active branch set for user")
-        
-        if not profile.active_directory:
-            raise HTTPException(status_code=400, detail="No active directory set for user")
-        
         # Check if there's already a running indexing job for this user
-        existing_job = await db.job.find_first(
+        existing_job = await tx.job.find_first(
             where={
                 "user_id": request.user_id,
                 "type": "index",
                 "status": {"in": ["pending", "running"]}
             }
         )
-        
-        if existing_job:
-            return {
-                "task_id": existing_job.task_id,
-                "status": existing_job.status,
-                "repo": profile.active_repo.github_full_name,
-                "branch": profile.active_branch,
-                "directory": profile.active_directory,
-                "message": "Indexing job already in progress"
-            }
     
-    # Start the indexing task
-    try:
-        logger.info(f"Dispatching indexing task: repo_id={profile.active_repo.id}, soft_reindex={request.soft_reindex}")
-        task = process_indexing.delay(
-            repo_id=profile.active_repo.id,
-            user_id=request.user_id,
-            github_full_name=profile.active_repo.github_full_name,
-            branch=profile.active_branch,
-            docs_directory=profile.active_directory,
-            github_access_token=profile.github_access_token,
-            soft_reindex=request.soft_reindex
-        )
-        logger.info(f"Task dispatched successfully: task_id={task.id}")
-    except Exception as e:
-        logger.error(f"Failed to dispatch indexing task: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to start indexing: {str(e)}")
+    _require_active_repo(profile)
     
-    # Create job record in database
-    async with get_db() as db:
-        job_metadata = {
-            "repo_id": profile.active_repo.id,
-            "repo_name": profile.active_repo.github_full_name,
-            "branch": profile.active_branch,
-            "directory": profile.active_directory,
-            "soft_reindex": request.soft_reindex
+    if existing_job:
+        return {
+            "task_id": existing_job.task_id,
+            "status": existing_job.status,
+            "repo": profile["github_full_name"],
+            "branch": profile["active_branch"],
+            "directory": profile["active_directory"],
+            "message": "Indexing job already in progress"
         }
-        
-        await db.job.create(
+    
+    # Create the job record before dispatching, so the task never runs without
+    # a row to report to and the duplicate check sees it in every API worker
+    task_id = str(uuid4())
+    job_metadata = {
+        "repo_id": profile["repo_id"],
+        "repo_name": profile["github_full_name"],
+        "branch": profile["active_branch"],
+        "directory": profile["active_directory"],
+        "soft_reindex": request.soft_reindex
+    }
+    
+    try:
+        await prisma.job.create(
             data={
-                "task_id": task.id,
+                "task_id": task_id,
                 "user_id": request.user_id,
                 "status": "pending",
                 "type": "index",
                 "progress": 0.0,
-                "metadata": json.dumps(job_metadata)
+                "metadata": Json(job_metadata)
             }
         )
+    except Exception as e:
+        logger.error(f"Failed to create job record for task {task_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to start indexing: {str(e)}")
+    
+    # Start the indexing task
+    token_key = None
+    try:
+        logger.info(f"Dispatching indexing task: repo_id={profile['repo_id']}, soft_reindex={request.soft_reindex}")
+        # Pass the GitHub token by reference so it never sits in the broker
+        token_key = await github_token_store.stash(profile["github_access_token"])
+        process_indexing.apply_async(
+            kwargs={
+                "repo_id": profile["repo_id"],
+                "user_id": request.user_id,
+                "github_full_name": profile["github_full_name"],
+                "branch": profile["active_branch"],
+                "docs_directory": profile["active_directory"],
+                "github_token_key": token_key,
+                "soft_reindex": request.soft_reindex
+            },
+            task_id=task_id
+        )
+        logger.info(f"Task dispatched successfully: task_id={task_id}")
+    except Exception as e:
+        logger.error(f"Failed to dispatch indexing task: {e}")
+        # No task will ever resolve the token, so don't leave it in Redis until it expires
+        await github_token_store.discard_async(token_key)
+        # Nothing will ever update the row, and a pending row would block later requests
+        try:
+            await prisma.job.delete(where={"task_id": task_id})
+        except Exception as delete_error:
+            logger.error(f"Failed to delete job record for undispatched task {task_id}: {delete_error}")
+        raise HTTPException(status_code=500, detail=f"Failed to start indexing: {str(e)}")
     
     return {
-        "task_id": task.id, 
+        "task_id": task_id, 
         "status": "pending",
-        "repo": profile.active_repo.github_full_name,
-        "branch": profile.active_branch,
-        "directory": profile.active_directory
-    } 
\ No newline at end of file
+        "repo": profile["github_full_name"],
+        "branch": profile["active_branch"],
+        "directory": profile["active_directory"]
+    }
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
 from typing import Optional
-import json
+import asyncio
+from uuid import UUID
+from prisma import Json
 
 from app.tasks.query import process_query
-from app.database import get_db
+from app.database import prisma
 
 router = APIRouter()
 
@@ -40,49 +42,75 @@ async def run_query(request: QueryRequest):
     if not request.repo_id:
         raise HTTPException(status_code=400, detail="Repository ID is required")
     
-    # Validate repo access and create job record in single database connection
-    async with get_db() as db:
-        # Validate that repo exists and user has access
-        repo = await db.repo.find_unique(
+    # Reject malformed IDs before touching the database
+    for field, value in (("user_id", request.user_id), ("repo_id", request.repo_id)):
+        try:
+            UUID(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid {field}")
+    
+    # Validate that repo exists while looking up the user's in-flight query jobs
+    repo, active_jobs = await asyncio.gather(
+        prisma.repo.find_unique(
             where={"id": request.repo_id},
             include={"users": True}
-        )
-        
-        if not repo:
-            raise HTTPException(status_code=404, detail="Repository not found")
-        
-        # Check if user owns the repo
-        if repo.owner_id != request.user_id:
-            raise HTTPException(status_code=403, detail="Access denied to repository")
-        
-        # Start the query processing task (this is fast, doesn't block database connection)
-        task = process_query.delay(
-            query=request.query,
-            user_id=request.user_id,
-            repo_id=request.repo_id
-        )
-        
-        # Create job record in the same database transaction
-        job_metadata = {
-            "repo_id": request.repo_id,
-            "query": request.query[:500],  # Truncate for storage
-            "repo_name": repo.github_full_name
-        }
-        
-        await db.job.create(
-            data={
-                "task_id": task.id,
-                "status": "pending",
+        ),
+        prisma.job.find_many(
+            where={
+                "user_id": request.user_id,
                 "type": "query",
-                "progress": 0.0,
-                "metadata": json.dumps(job_metadata),
-                "users": {
-                    "connect": {
-                        "id": request.user_id
-                    }
-                }
+                "status": {"in": ["pending", "running"]}
             }
         )
+    )
+    
+    if not repo:
+        raise HTTPException(status_code=404, detail="Repository not found")
+    
+    # Check if user owns the repo
+    if repo.owner_id != request.user_id:
+        raise HTTPException(status_code=403, detail="Access denied to repository")
+    
+    # Reuse an in-flight job for the same query instead of dispatching a duplicate
+    truncated_query = request.query[:500]
+    for job in active_jobs:
+        metadata = job.metadata if isinstance(job.metadata, dict) else {}
+        if metadata.get("repo_id") == request.repo_id and metadata.get("query") == truncated_query:
+            return QueryResponse(
+                task_id=job.task_id,
+                status=job.status,
+                message="Query already in progress",
+                repo=repo.github_full_name
+            )
+    
+    # Start the query processing task
+    task = process_query.apply_async(kwargs={
+        "query": request.query,
+        "user_id": request.user_id,
+        "repo_id": request.repo_id
+    })
+    
+    # Create job record
+    job_metadata = {
+        "repo_id": request.repo_id,
+        "query": truncated_query,  # Truncate for storage
+        "repo_name": repo.github_full_name
+    }
+    
+    await prisma.job.create(
+        data={
+            "task_id": task.id,
+            "status": "pending",
+            "type": "query",
+            "progress": 0.0,
+            "metadata": Json(job_metadata),
+            "users": {
+                "connect": {
+                    "id": request.user_id
+                }
+            }
+        }
+    )
     
     return QueryResponse(
         task_id=task.id,
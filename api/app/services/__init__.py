@@ -15,6 +15,7 @@ This module contains various service classes and utilities for:
 - Merkle tree calculations
 - Real-time notifications
 - Indexing orchestration
+- Short-lived GitHub token storage for Celery tasks
 """
 
 from .supabase_client import supabase_client
@@ -30,6 +31,7 @@ from .chunk_service import ChunkService
 from .database_service import DatabaseService
 from .merkle_tree_service import MerkleTreeService
 from .indexing_orchestrator import IndexingOrchestrator
+from .token_store import github_token_store
 
 __all__ = [
     "supabase_client",
@@ -46,5 +48,6 @@ __all__ = [
     "ChunkService",
     "DatabaseService",
     "MerkleTreeService",
-    "IndexingOrchestrator"
+    "IndexingOrchestrator",
+    "github_token_store"
 ] 
\ No newline at end of file
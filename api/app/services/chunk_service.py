@@ -2,9 +2,13 @@
 Chunk service for handling text chunking and embedding generation
 """
 
+import asyncio
 import hashlib
 import logging
-from typing import List, Dict, Any, Tuple
+import numpy as np
+import orjson
+from contextlib import aclosing
+from typing import List, Dict, Any, AsyncIterable, AsyncIterator, Iterable, Optional, Set, Tuple, Union
 
 from app.services.openai_client import openai_service
 from app.database import prisma
@@ -15,148 +19,410 @@ logger = logging.getLogger(__name__)
 class ChunkService:
     """Service for processing text chunks and generating embeddings"""
     
+    # Maximum number of chunk texts sent per embeddings request
+    EMBEDDING_BATCH_SIZE = 128
+    
+    # Token budget per embeddings request, well under the API's per-request limit
+    EMBEDDING_BATCH_TOKENS = 100_000
+    
+    # Number of chunk rows written per INSERT statement
+    INSERT_BATCH_SIZE = 200
+    
+    # Number of embedding workers (and so embedding requests) in flight at once
+    EMBEDDING_CONCURRENCY = 5
+    
+    # Maximum batches buffered between pipeline stages
+    PIPELINE_QUEUE_SIZE = 10
+    
     @staticmethod
-    async def process_chunks_for_files(files_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def process_chunks_for_files(
+        files_data: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
         """
         Split files into semantic chunks and generate embeddings
         
+        Runs as a pipeline connected by bounded queues: files are split into
+        batches of unique chunks, several workers check each batch against the
+        database and embed the missing chunks, and a writer inserts embedded
+        chunks while later batches are still being split and embedded.
+        
+        Files may also be streamed in through an async iterable, in which case
+        chunking starts while later files are still being produced.
+        
         Args:
-            files_data: List of file data dictionaries
+            files_data: File data dictionaries, as a list or an async iterable
             
         Returns:
-            List of chunk data dictionaries
+            List of chunk data dictionaries (hash, position and file path, without content)
         """
-        chunks_data = []
+        if isinstance(files_data, list):
+            logger.info(f"Processing chunks for {len(files_data)} files")
+        
+        candidate_chunks: List[Dict[str, Any]] = []
+        failed_hashes: Set[str] = set()
+        to_embed: asyncio.Queue = asyncio.Queue(maxsize=ChunkService.PIPELINE_QUEUE_SIZE)
+        to_store: asyncio.Queue = asyncio.Queue(maxsize=ChunkService.PIPELINE_QUEUE_SIZE)
+        
+        stages = [
+            asyncio.create_task(ChunkService._produce_chunk_batches(files_data, candidate_chunks, to_embed)),
+            asyncio.create_task(ChunkService._run_embedding_stage(to_embed, to_store, failed_hashes)),
+            asyncio.create_task(ChunkService._run_storage_stage(to_store)),
+        ]
         
-        logger.info(f"Processing chunks for {len(files_data)} files")
+        try:
+            await asyncio.gather(*stages)
+        except Exception:
+            # Stop the remaining stages so none of them waits on a queue forever
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            raise
         
-        for file_data in files_data:
-            file_chunks = await ChunkService._process_chunks_for_single_file(file_data)
-            chunks_data.extend(file_chunks)
+        chunks_data = [chunk for chunk in candidate_chunks if chunk['hash'] not in failed_hashes]
         
         logger.info(f"Generated {len(chunks_data)} total chunks")
         return chunks_data
     
     @staticmethod
-    async def _process_chunks_for_single_file(file_data: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Process chunks for a single file"""
+    async def _produce_chunk_batches(
+        files_data: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]], 
+        candidate_chunks: List[Dict[str, Any]], 
+        to_embed: asyncio.Queue
+    ) -> None:
+        """Split files into chunks and queue batches of previously unseen chunk hashes"""
+        # Identical chunks (shared boilerplate, repeated files) are looked up,
+        # embedded and stored once per hash
+        seen_hashes: Set[str] = set()
+        pending: List[Dict[str, Any]] = []
+        pending_tokens = 0
+        
+        async with aclosing(ChunkService._iterate_files(files_data)) as files:
+            async for file_data in files:
+                # Splitting, hashing and token counting are CPU-bound; running them
+                # on a worker thread keeps embedding requests and uploads moving
+                file_chunks = await asyncio.to_thread(ChunkService._split_file_into_chunks, file_data)
+                
+                # Returned records only carry what the file-chunk rows need; chunk
+                # text lives only in queued batches and is released once stored
+                candidate_chunks.extend(
+                    {key: value for key, value in chunk.items() if key != 'content'}
+                    for chunk in file_chunks
+                )
+                
+                unseen_chunks = []
+                for chunk in file_chunks:
+                    if chunk['hash'] not in seen_hashes:
+                        seen_hashes.add(chunk['hash'])
+                        unseen_chunks.append(chunk)
+                
+                # Counted once here; reused for batching and when storing the chunk
+                token_counts = await asyncio.to_thread(
+                    openai_service.count_tokens_batch, [chunk['content'] for chunk in unseen_chunks]
+                )
+                
+                for chunk, token_count in zip(unseen_chunks, token_counts):
+                    chunk['token_count'] = token_count
+                    
+                    # Close the batch before it would exceed the request token budget
+                    if pending and pending_tokens + chunk['token_count'] > ChunkService.EMBEDDING_BATCH_TOKENS:
+                        await to_embed.put(pending)
+                        pending = []
+                        pending_tokens = 0
+                    
+                    pending.append(chunk)
+                    pending_tokens += chunk['token_count']
+                    
+                    if len(pending) >= ChunkService.EMBEDDING_BATCH_SIZE:
+                        await to_embed.put(pending)
+                        pending = []
+                        pending_tokens = 0
+        
+        if pending:
+            await to_embed.put(pending)
+        
+        # One end marker per embedding worker
+        for _ in range(ChunkService.EMBEDDING_CONCURRENCY):
+            await to_embed.put(None)
+    
+    @staticmethod
+    async def _iterate_files(
+        files_data: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over files given either as a plain iterable or an async iterable"""
+        if hasattr(files_data, '__aiter__'):
+            if hasattr(files_data, 'aclose'):
+                # Close the source as well, so its cleanup runs if chunking stops early
+                async with aclosing(files_data):
+                    async for file_data in files_data:
+                        yield file_data
+            else:
+                async for file_data in files_data:
+                    yield file_data
+        else:
+            for file_data in files_data:
+                yield file_data
+    
+    @staticmethod
+    async def _run_embedding_stage(
+        to_embed: asyncio.Queue, 
+        to_store: asyncio.Queue, 
+        failed_hashes: Set[str]
+    ) -> None:
+        """Run the embedding workers, then signal the storage stage"""
+        await asyncio.gather(*(
+            ChunkService._embed_chunk_batches(to_embed, to_store, failed_hashes)
+            for _ in range(ChunkService.EMBEDDING_CONCURRENCY)
+        ))
+        await to_store.put(None)
+    
+    @staticmethod
+    async def _embed_chunk_batches(
+        to_embed: asyncio.Queue, 
+        to_store: asyncio.Queue, 
+        failed_hashes: Set[str]
+    ) -> None:
+        """Embedding worker: embed the chunks of each batch missing from the database"""
+        while True:
+            batch = await to_embed.get()
+            if batch is None:
+                return
+            
+            # Only chunks not already stored need embeddings
+            existing_hashes = await ChunkService._get_existing_chunk_hashes([chunk['hash'] for chunk in batch])
+            new_chunks = [chunk for chunk in batch if chunk['hash'] not in existing_hashes]
+            
+            logger.debug(f"{len(batch) - len(new_chunks)} chunks already stored, {len(new_chunks)} need embeddings")
+            
+            rows = await ChunkService._embed_chunks(new_chunks, failed_hashes)
+            if rows:
+                await to_store.put(rows)
+    
+    @staticmethod
+    async def _run_storage_stage(to_store: asyncio.Queue) -> None:
+        """Storage writer: insert embedded chunks as batches arrive"""
+        while True:
+            rows = await to_store.get()
+            if rows is None:
+                return
+            
+            # Store chunks in database
+            await ChunkService._store_new_chunks(rows)
+    
+    @staticmethod
+    def _split_file_into_chunks(file_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Split a single file into chunk data dictionaries"""
         content = file_data['content']
         file_path = file_data['path']
         
-        logger.info(f"Processing chunks for file: {file_path}")
-        
         # Split into chunks using OpenAI service
         chunks = openai_service.split_text_by_tokens(content)
         
-        # Calculate line positions for each chunk
-        chunk_line_positions = ChunkService._calculate_chunk_line_positions(content, chunks)
+        # Locate and decode chunks once for both line positions and hashing
+        chunk_offsets = ChunkService._locate_chunks(content, chunks)
+        codepoints = ChunkService._codepoints(content)
+        chunk_line_positions = ChunkService._calculate_chunk_line_positions(
+            content, chunks, chunk_offsets, codepoints
+        )
+        chunk_hashes = ChunkService._hash_chunks(content, chunks, chunk_offsets, codepoints)
         
-        # Process chunks with calculated line positions
         file_chunks = []
         for i, chunk_content in enumerate(chunks):
-            chunk_data = await ChunkService._process_single_chunk(
-                chunk_content, i, chunk_line_positions[i], file_data
-            )
-            if chunk_data:
-                file_chunks.append(chunk_data)
+            start_line, end_line = chunk_line_positions[i]
+            file_chunks.append({
+                'hash': chunk_hashes[i],
+                'content': chunk_content,
+                'start_line': start_line,
+                'end_line': end_line,
+                'chunk_order': i,
+                'file_path': file_path
+            })
         
-        logger.info(f"Generated {len(file_chunks)} chunks for file: {file_path}")
+        logger.info(f"Split {file_path} into {len(file_chunks)} chunks")
         return file_chunks
     
     @staticmethod
-    async def _process_single_chunk(
-        chunk_content: str, 
-        chunk_order: int, 
-        line_positions: Tuple[int, int], 
-        file_data: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        """Process a single chunk and generate embedding if needed"""
-        # Calculate chunk hash
-        chunk_hash = hashlib.sha256(chunk_content.encode('utf-8')).hexdigest()
-        
-        # Get line positions
-        start_line, end_line = line_positions
-        
-        # Check if chunk already exists using raw SQL
-        existing_chunk_result = await prisma.query_raw(
-            "SELECT hash, token_count FROM public.chunk WHERE hash = $1 LIMIT 1",
-            chunk_hash
+    async def _get_existing_chunk_hashes(chunk_hashes: List[str]) -> Set[str]:
+        """Return the subset of chunk hashes already stored in the database"""
+        if not chunk_hashes:
+            return set()
+        
+        rows = await prisma.query_raw(
+            "SELECT hash FROM public.chunk WHERE hash = ANY($1::text[])",
+            chunk_hashes
         )
-        existing_chunk = existing_chunk_result[0] if existing_chunk_result else None
+        return {row['hash'] for row in rows}
+    
+    @staticmethod
+    async def _embed_chunks(
+        new_chunks: List[Dict[str, Any]], 
+        failed_hashes: Set[str]
+    ) -> List[Tuple[str, str, List[float], int]]:
+        """
+        Generate embeddings for new chunks in a single batched request
         
-        if not existing_chunk:
-            # Generate embedding for new chunk
-            embedding = await ChunkService._generate_embedding_for_chunk(chunk_content)
-            if not embedding:
-                logger.warning(f"Failed to generate embedding for chunk {chunk_order} in {file_data['path']}")
-                return None
+        Args:
+            new_chunks: Chunk data dictionaries not yet present in the database
+            failed_hashes: Set collecting hashes of chunks that couldn't be embedded
             
-            # Calculate token count
-            token_count = openai_service.count_tokens(chunk_content)
+        Returns:
+            (hash, content, embedding, token_count) rows ready to store
+        """
+        # Empty chunks can't be embedded and would fail a whole batch request
+        embeddable = []
+        for chunk in new_chunks:
+            if chunk['content'].strip():
+                embeddable.append(chunk)
+            else:
+                failed_hashes.add(chunk['hash'])
+        
+        embeddings = await openai_service.generate_embeddings_batch(
+            [chunk['content'] for chunk in embeddable],
+            batch_size=ChunkService.EMBEDDING_BATCH_SIZE
+        )
+        
+        # Retry failed chunks on their own so a failed batch doesn't drop every
+        # chunk in it; the retries run together, bounded like the batch requests
+        failed = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if failed:
+            semaphore = asyncio.Semaphore(ChunkService.EMBEDDING_CONCURRENCY)
             
-            # Store chunk in database
-            await ChunkService._store_new_chunk(chunk_hash, chunk_content, embedding, token_count)
+            async def _retry(chunk: Dict[str, Any]) -> Optional[List[float]]:
+                async with semaphore:
+                    return await ChunkService._generate_embedding_for_chunk(chunk['content'])
             
-            logger.debug(f"Created new chunk with hash {chunk_hash[:8]}...")
-        else:
-            logger.debug(f"Using existing chunk with hash {chunk_hash[:8]}...")
+            retried = await asyncio.gather(*(_retry(embeddable[i]) for i in failed))
+            for i, embedding in zip(failed, retried):
+                embeddings[i] = embedding
         
-        return {
-            'hash': chunk_hash,
-            'content': chunk_content,
-            'start_line': start_line,
-            'end_line': end_line,
-            'chunk_order': chunk_order,
-            'file_path': file_data['path']
-        }
+        rows = []
+        for chunk, embedding in zip(embeddable, embeddings):
+            if not embedding:
+                logger.warning(f"Failed to generate embedding for chunk {chunk['chunk_order']} in {chunk['file_path']}")
+                failed_hashes.add(chunk['hash'])
+                continue
+            
+            rows.append((chunk['hash'], chunk['content'], embedding, chunk['token_count']))
+        
+        return rows
     
     @staticmethod
-    def _calculate_chunk_line_positions(content: str, chunks: List[str]) -> List[Tuple[int, int]]:
-        """Calculate line positions for each chunk"""
-        chunk_line_positions = []
+    def _locate_chunks(content: str, chunks: List[str]) -> List[Optional[int]]:
+        """
+        Find the start offset of each chunk in a single forward sweep
         
-        for i, chunk_content in enumerate(chunks):
-            # Find where this chunk starts in the original content
-            if i == 0:
-                start_pos = 0
+        Returns:
+            Start offset per chunk, or None if the chunk isn't found verbatim
+        """
+        offsets = []
+        cursor = 0
+        
+        for chunk_content in chunks:
+            # Chunks overlap, so the next one starts after the previous start
+            # rather than after the previous end
+            start_pos = content.find(chunk_content, cursor)
+            if start_pos == -1:
+                offsets.append(None)
             else:
-                # Use the previous chunk end to find where this one starts
-                prev_chunk = chunks[i-1]
-                # Find the position after the previous chunk
-                prev_end_pos = content.find(prev_chunk) + len(prev_chunk)
-                # The current chunk starts somewhere after the previous one
-                # Need to find exact position accounting for potential overlaps
-                search_start = max(0, prev_end_pos - 200)  # Look back a bit to handle overlaps
-                remaining_content = content[search_start:]
-                chunk_start_in_remaining = remaining_content.find(chunk_content)
-                if chunk_start_in_remaining == -1:
-                    # Fallback if exact match isn't found (could happen with whitespace differences)
-                    # Use approximate position
-                    start_pos = prev_end_pos
-                else:
-                    start_pos = search_start + chunk_start_in_remaining
+                offsets.append(start_pos)
+                cursor = start_pos + 1
+        
+        return offsets
+    
+    @staticmethod
+    def _calculate_chunk_line_positions(
+        content: str, 
+        chunks: List[str], 
+        chunk_offsets: Optional[List[Optional[int]]] = None,
+        codepoints: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, int]]:
+        """
+        Calculate line positions for each chunk
+        
+        All chunk offsets are mapped to line numbers in one vectorized lookup.
+        """
+        if not chunks:
+            return []
+        
+        if chunk_offsets is None:
+            chunk_offsets = ChunkService._locate_chunks(content, chunks)
+        
+        if codepoints is None:
+            codepoints = ChunkService._codepoints(content)
+        
+        # Newline offsets line up with str indices
+        newline_positions = np.flatnonzero(codepoints == 0x0A)
+        
+        start_positions = []
+        end_positions = []
+        prev_end_pos = 0
+        
+        for chunk_content, start_pos in zip(chunks, chunk_offsets):
+            if start_pos is None:
+                # Fallback if exact match isn't found (could happen with whitespace differences)
+                # Use approximate position
+                start_pos = prev_end_pos
             
             # Get chunk end position
-            end_pos = start_pos + len(chunk_content)
-            
-            # Calculate line numbers
-            start_line = 1
-            end_line = 1
-            
-            # Count newlines before start position
-            start_text = content[:start_pos]
-            start_line = start_text.count('\n') + 1  # 1-based line numbers
-            
-            # Count newlines before end position
-            end_text = content[:end_pos]
-            end_line = end_text.count('\n') + 1
-            
-            # Ensure end_line is at least start_line
-            end_line = max(start_line, end_line)
+            prev_end_pos = start_pos + len(chunk_content)
+            start_positions.append(start_pos)
+            end_positions.append(prev_end_pos)
+        
+        # Newlines before each position give the 1-based line number
+        start_lines = np.searchsorted(newline_positions, start_positions, side='left') + 1
+        end_lines = np.searchsorted(newline_positions, end_positions, side='left') + 1
+        
+        # Ensure end_line is at least start_line
+        end_lines = np.maximum(start_lines, end_lines)
+        
+        return list(zip(start_lines.tolist(), end_lines.tolist()))
+    
+    @staticmethod
+    def _codepoints(content: str) -> np.ndarray:
+        """One array element per character, so array indices line up with str indices"""
+        return np.frombuffer(content.encode('utf-32-le'), dtype=np.uint32)
+    
+    @staticmethod
+    def _hash_chunks(
+        content: str, 
+        chunks: List[str], 
+        chunk_offsets: List[Optional[int]],
+        codepoints: Optional[np.ndarray] = None
+    ) -> List[str]:
+        """
+        Calculate the SHA-256 hash of each chunk
+        
+        The file is encoded to UTF-8 once and located chunks are hashed from
+        slices of that buffer instead of encoding every chunk separately.
+        """
+        if not chunks:
+            return []
+        
+        content_view = memoryview(content.encode('utf-8'))
+        
+        if len(content_view) == len(content):
+            # ASCII only: character and byte offsets coincide
+            byte_offsets = None
+        else:
+            if codepoints is None:
+                codepoints = ChunkService._codepoints(content)
+            # UTF-8 width of each character, accumulated into the byte offset
+            # at which each character starts
+            widths = 1 + (codepoints >= 0x80).astype(np.int64) + (codepoints >= 0x800) + (codepoints >= 0x10000)
+            byte_offsets = np.zeros(len(codepoints) + 1, dtype=np.int64)
+            np.cumsum(widths, out=byte_offsets[1:])
+        
+        hashes = []
+        for chunk_content, start_pos in zip(chunks, chunk_offsets):
+            if start_pos is None:
+                hashes.append(hashlib.sha256(chunk_content.encode('utf-8')).hexdigest())
+                continue
             
-            chunk_line_positions.append((start_line, end_line))
+            end_pos = start_pos + len(chunk_content)
+            if byte_offsets is not None:
+                start_pos, end_pos = int(byte_offsets[start_pos]), int(byte_offsets[end_pos])
+            hashes.append(hashlib.sha256(content_view[start_pos:end_pos]).hexdigest())
         
-        return chunk_line_positions
+        return hashes
     
     @staticmethod
     async def _generate_embedding_for_chunk(chunk_content: str) -> List[float]:
@@ -169,27 +435,33 @@ class ChunkService:
             return None
     
     @staticmethod
-    async def _store_new_chunk(
-        chunk_hash: str, 
-        chunk_content: str, 
-        embedding: List[float], 
-        token_count: int
-    ) -> None:
-        """Store a new chunk in the database using raw SQL for vector compatibility"""
-        try:
-            # Use raw SQL to insert chunks with vector embeddings
-            # Note: Using raw SQL instead of Prisma mutations due to vector field limitations
-            await prisma.execute_raw(
-                """
-                INSERT INTO public.chunk (hash, content, embedding, token_count, created_at)
-                VALUES ($1, $2, $3, $4, NOW())
-                ON CONFLICT (hash) DO NOTHING
-                """,
-                chunk_hash,
-                chunk_content,
-                embedding,
-                token_count
-            )
-        except Exception as e:
-            logger.error(f"Failed to store chunk {chunk_hash[:8]}: {e}")
-            raise
+    async def _store_new_chunks(rows: List[Tuple[str, str, List[float], int]]) -> None:
+        """
+        Store new chunks in the database using raw SQL for vector compatibility
+        
+        Args:
+            rows: (hash, content, embedding, token_count) tuples
+        """
+        for i in range(0, len(rows), ChunkService.INSERT_BATCH_SIZE):
+            batch = rows[i:i + ChunkService.INSERT_BATCH_SIZE]
+            try:
+                # Use raw SQL to insert chunks with vector embeddings
+                # Note: Using raw SQL instead of Prisma mutations due to vector field limitations
+                # Embeddings are sent as pgvector text literals and cast per row
+                await prisma.execute_raw(
+                    """
+                    INSERT INTO public.chunk (hash, content, embedding, token_count, created_at)
+                    SELECT h, c, e::vector, t, NOW()
+                    FROM UNNEST($1::text[], $2::text[], $3::text[], $4::int[]) AS u(h, c, e, t)
+                    ON CONFLICT (hash) DO NOTHING
+                    """,
+                    [row[0] for row in batch],
+                    [row[1] for row in batch],
+                    [orjson.dumps(row[2]).decode() for row in batch],
+                    [row[3] for row in batch]
+                )
+            except Exception as e:
+                logger.error(f"Failed to store {len(batch)} chunks starting at {batch[0][0][:8]}: {e}")
+                raise
+            
+            logger.debug(f"Stored {len(batch)} new chunks")
@@ -3,7 +3,7 @@ Database service for handling database operations during indexing
 """
 
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
 from app.database import prisma
 
@@ -13,6 +13,9 @@ logger = logging.getLogger(__name__)
 class DatabaseService:
     """Service for handling database operations during indexing"""
     
+    # Number of file-chunk rows written per INSERT statement
+    FILE_CHUNK_BATCH_SIZE = 1000
+    
     @staticmethod
     async def store_files_and_chunks(
         repo_id: str, 
@@ -35,7 +38,7 @@ class DatabaseService:
         await DatabaseService._store_files(repo_id, files_data, soft_reindex)
         
         # Then store file-chunk relationships
-        await DatabaseService._store_file_chunk_relationships(chunks_data)
+        await DatabaseService._store_file_chunk_relationships(repo_id, chunks_data)
         
         logger.info("Successfully stored all files and chunks in database")
     
@@ -107,7 +110,7 @@ class DatabaseService:
         logger.debug(f"Updated file: {file_data['path']}")
     
     @staticmethod
-    async def _store_file_chunk_relationships(chunks_data: List[Dict[str, Any]]) -> None:
+    async def _store_file_chunk_relationships(repo_id: str, chunks_data: List[Dict[str, Any]]) -> None:
         """Store file-chunk relationships in the database"""
         logger.info(f"Storing {len(chunks_data)} file-chunk relationships")
         
@@ -119,52 +122,62 @@ class DatabaseService:
                 chunks_by_file[file_path] = []
             chunks_by_file[file_path].append(chunk)
         
-        # Process each file's chunks
+        if not chunks_by_file:
+            return
+        
+        # Fetch all of this repository's file records in one query
+        file_records = await prisma.file.find_many(
+            where={
+                "repo_id": repo_id,
+                "path": {"in": list(chunks_by_file)}
+            }
+        )
+        files_by_path = {file_record.path: file_record for file_record in file_records}
+        
+        # Collect relationship rows for every file
+        rows = []
         for file_path, file_chunks in chunks_by_file.items():
-            await DatabaseService._store_chunks_for_file(file_path, file_chunks)
+            file_record = files_by_path.get(file_path)
+            if not file_record:
+                logger.error(f"File record not found for path: {file_path}")
+                continue
+            
+            for chunk in file_chunks:
+                rows.append((file_record.id, chunk['hash'], chunk['chunk_order'], chunk['start_line'], chunk['end_line']))
+        
+        await DatabaseService._upsert_file_chunks(rows)
     
     @staticmethod
-    async def _store_chunks_for_file(file_path: str, file_chunks: List[Dict[str, Any]]) -> None:
-        """Store chunks for a specific file"""
-        # Get the file record
-        file_record = await prisma.file.find_first(
-            where={"path": file_path}
-        )
-        
-        if not file_record:
-            logger.error(f"File record not found for path: {file_path}")
-            return
+    async def _upsert_file_chunks(rows: List[Tuple[str, str, int, int, int]]) -> None:
+        """
+        Upsert file-chunk relationship rows with one statement per batch
         
-        # Store each chunk relationship
-        for chunk in file_chunks:
+        Args:
+            rows: (file_id, chunk_hash, chunk_order, start_line, end_line) tuples
+        """
+        for i in range(0, len(rows), DatabaseService.FILE_CHUNK_BATCH_SIZE):
+            batch = rows[i:i + DatabaseService.FILE_CHUNK_BATCH_SIZE]
             try:
-                await prisma.file_chunk.upsert(
-                    where={
-                        "file_id_chunk_order": {
-                            "file_id": file_record.id,
-                            "chunk_order": chunk['chunk_order']
-                        }
-                    },
-                    data={
-                        "create": {
-                            "file_id": file_record.id,
-                            "chunk_hash": chunk['hash'],
-                            "chunk_order": chunk['chunk_order'],
-                            "start_line": chunk['start_line'],
-                            "end_line": chunk['end_line']
-                        },
-                        "update": {
-                            "chunk_hash": chunk['hash'],
-                            "start_line": chunk['start_line'],
-                            "end_line": chunk['end_line']
-                        }
-                    }
+                await prisma.execute_raw(
+                    """
+                    INSERT INTO public.file_chunk (file_id, chunk_hash, chunk_order, start_line, end_line)
+                    SELECT * FROM UNNEST($1::uuid[], $2::text[], $3::int[], $4::int[], $5::int[])
+                    ON CONFLICT (file_id, chunk_order) DO UPDATE
+                    SET chunk_hash = EXCLUDED.chunk_hash,
+                        start_line = EXCLUDED.start_line,
+                        end_line = EXCLUDED.end_line
+                    """,
+                    [row[0] for row in batch],
+                    [row[1] for row in batch],
+                    [row[2] for row in batch],
+                    [row[3] for row in batch],
+                    [row[4] for row in batch]
                 )
                 
+                logger.debug(f"Stored {len(batch)} chunk relationships")
+                
             except Exception as e:
-                logger.error(f"Failed to store chunk relationship for {file_path}, chunk {chunk['chunk_order']}: {e}")
-        
-        logger.debug(f"Stored {len(file_chunks)} chunk relationships for file: {file_path}")
+                logger.error(f"Failed to store {len(batch)} chunk relationships: {e}")
     
     @staticmethod
     async def update_repository_sync_info(
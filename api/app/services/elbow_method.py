@@ -17,7 +17,14 @@ class ElbowAnalyzer:
     Analyzes similarity scores to find the elbow point using various algorithms
     """
     
-    def __init__(self, min_docs: int = 3, max_docs: int = 50, significance_threshold: float = 0.15):
+    def __init__(
+        self, 
+        min_docs: int = 3, 
+        max_docs: int = 50, 
+        significance_threshold: float = 0.15,
+        flat_range_threshold: float = 0.05,
+        steep_drop_threshold: float = 0.5
+    ):
         """
         Initialize the elbow analyzer
         
@@ -25,10 +32,14 @@ class ElbowAnalyzer:
             min_docs: Minimum number of documents to return (safety net)
             max_docs: Maximum number of documents to consider (performance limit) 
             significance_threshold: Minimum similarity score to consider relevant
+            flat_range_threshold: Score range below which scores are treated as flat
+            steep_drop_threshold: Drop after the top score above which only the minimum is kept
         """
         self.min_docs = min_docs
         self.max_docs = max_docs
         self.significance_threshold = significance_threshold
+        self.flat_range_threshold = flat_range_threshold
+        self.steep_drop_threshold = steep_drop_threshold
     
     def find_elbow_point(self, similarity_scores: List[float]) -> Tuple[int, Dict[str, Any]]:
         """
@@ -44,17 +55,29 @@ class ElbowAnalyzer:
             logger.warning(f"Insufficient similarity scores ({len(similarity_scores)}), using minimum: {self.min_docs}")
             return self.min_docs, {"method": "fallback_min", "reason": "insufficient_data"}
         
-        # Limit analysis to max_docs for performance
-        scores = similarity_scores[:self.max_docs] if len(similarity_scores) > self.max_docs else similarity_scores
+        # Limit analysis to max_docs for performance; converted once and the
+        # resulting array shared by the filter and all detectors
+        scores = np.asarray(similarity_scores[:self.max_docs], dtype=np.float64)
         
         # Filter out very low scores
-        relevant_scores = [score for score in scores if score >= self.significance_threshold]
-        if len(relevant_scores) < self.min_docs:
-            logger.info(f"Only {len(relevant_scores)} scores above threshold {self.significance_threshold}, using all available")
-            relevant_scores = scores[:self.min_docs] if len(scores) >= self.min_docs else scores
+        relevant_scores = scores[scores >= self.significance_threshold]
+        if relevant_scores.size < self.min_docs:
+            logger.info(f"Only {relevant_scores.size} scores above threshold {self.significance_threshold}, using all available")
+            relevant_scores = scores[:self.min_docs]
         
-        if len(relevant_scores) <= self.min_docs:
-            return len(relevant_scores), {"method": "threshold_filter", "scores_above_threshold": len(relevant_scores)}
+        if relevant_scores.size <= self.min_docs:
+            return relevant_scores.size, {"method": "threshold_filter", "scores_above_threshold": relevant_scores.size}
+        
+        # Flat scores have no elbow to find, skip the detectors
+        if relevant_scores[0] - relevant_scores[-1] < self.flat_range_threshold:
+            adaptive_point = self._adaptive_threshold_fallback(relevant_scores)
+            logger.info(f"Similarity scores are flat, using adaptive fallback: {adaptive_point}")
+            return adaptive_point, {"method": "flat_scores", "point": adaptive_point}
+        
+        # A steep drop right after the top score is the elbow
+        if relevant_scores[0] - relevant_scores[1] > self.steep_drop_threshold:
+            logger.info(f"Steep drop after top score, using minimum: {self.min_docs}")
+            return self.min_docs, {"method": "steep_drop", "point": self.min_docs}
         
         # Try multiple elbow detection methods
         methods_results = []
@@ -77,21 +100,25 @@ class ElbowAnalyzer:
         # Choose the best result
         if methods_results:
             # Use the median of all valid methods for robustness
-            all_points = [point for _, point in methods_results]
-            optimal_point = int(np.median(all_points))
+            # At most three points, so take the median directly rather than via NumPy
+            all_points = sorted(point for _, point in methods_results)
+            if len(all_points) == 2:
+                optimal_point = (all_points[0] + all_points[1]) // 2
+            else:
+                optimal_point = all_points[len(all_points) // 2]
             
             # Ensure we stay within bounds
-            optimal_point = max(self.min_docs, min(optimal_point, len(relevant_scores)))
+            optimal_point = max(self.min_docs, min(optimal_point, relevant_scores.size))
             
             analysis_metadata = {
                 "method": "ensemble",
                 "individual_methods": dict(methods_results),
                 "chosen_point": optimal_point,
-                "total_scores": len(scores),
-                "relevant_scores": len(relevant_scores),
-                "highest_score": scores[0] if scores else 0.0,
-                "lowest_score": scores[-1] if scores else 0.0,
-                "elbow_score": relevant_scores[optimal_point-1] if optimal_point <= len(relevant_scores) else 0.0
+                "total_scores": scores.size,
+                "relevant_scores": relevant_scores.size,
+                "highest_score": float(scores[0]) if scores.size else 0.0,
+                "lowest_score": float(scores[-1]) if scores.size else 0.0,
+                "elbow_score": float(relevant_scores[optimal_point-1]) if optimal_point <= relevant_scores.size else 0.0
             }
             
             logger.info(f"Elbow method selected {optimal_point} documents using ensemble approach")
@@ -102,7 +129,7 @@ class ElbowAnalyzer:
         logger.warning(f"All elbow methods failed, using adaptive fallback: {adaptive_point}")
         return adaptive_point, {"method": "adaptive_fallback", "point": adaptive_point}
     
-    def _detect_knee_point(self, scores: List[float]) -> int:
+    def _detect_knee_point(self, scores: np.ndarray) -> int:
         """
         Detect elbow using the knee detection algorithm (perpendicular distance method)
         """
@@ -110,25 +137,17 @@ class ElbowAnalyzer:
             if len(scores) < 3:
                 return 0
             
-            # Create coordinate points (index, score)
-            points = np.array([(i, score) for i, score in enumerate(scores)])
+            y = scores
+            x = np.arange(y.size, dtype=np.float64)
             
-            # Get first and last points for the line
-            first_point = points[0]
-            last_point = points[-1]
+            # Line between the first and last points
+            dx, dy = x[-1] - x[0], y[-1] - y[0]
             
-            # Calculate distances from each point to the line between first and last
-            distances = []
-            for point in points[1:-1]:  # Skip first and last points
-                # Calculate perpendicular distance to line
-                distance = self._point_to_line_distance(point, first_point, last_point)
-                distances.append(distance)
-            
-            if not distances:
-                return 0
+            # Perpendicular distance of every point to that line in closed form
+            distances = np.abs(dy * x - dx * y + x[-1] * y[0] - y[-1] * x[0]) / np.hypot(dx, dy)
             
-            # Find the point with maximum distance (the "knee")
-            max_distance_idx = np.argmax(distances) + 1  # +1 because we skipped first point
+            # Find the point with maximum distance (the "knee"), skipping first and last points
+            max_distance_idx = int(np.argmax(distances[1:-1])) + 1  # +1 because we skipped first point
             
             return max_distance_idx + 1  # +1 for 1-based counting
             
@@ -136,27 +155,7 @@ class ElbowAnalyzer:
             logger.error(f"Knee detection failed: {e}")
             return 0
     
-    def _point_to_line_distance(self, point: np.ndarray, line_start: np.ndarray, line_end: np.ndarray) -> float:
-        """Calculate perpendicular distance from point to line"""
-        # Vector from line_start to line_end
-        line_vec = line_end - line_start
-        # Vector from line_start to point
-        point_vec = point - line_start
-        
-        # Project point_vec onto line_vec
-        line_len = np.linalg.norm(line_vec)
-        if line_len == 0:
-            return np.linalg.norm(point_vec)
-        
-        line_unitvec = line_vec / line_len
-        proj_length = np.dot(point_vec, line_unitvec)
-        proj = proj_length * line_unitvec
-        
-        # Calculate perpendicular distance
-        perpendicular = point_vec - proj
-        return np.linalg.norm(perpendicular)
-    
-    def _detect_rate_change_elbow(self, scores: List[float], sensitivity: float = 2.0) -> int:
+    def _detect_rate_change_elbow(self, scores: np.ndarray, sensitivity: float = 2.0) -> int:
         """
         Detect elbow by finding where the rate of decrease significantly changes
         """
@@ -165,15 +164,12 @@ class ElbowAnalyzer:
                 return 0
             
             # Calculate first and second derivatives (rate of change)
-            first_diffs = [scores[i] - scores[i+1] for i in range(len(scores)-1)]
-            second_diffs = [first_diffs[i] - first_diffs[i+1] for i in range(len(first_diffs)-1)]
-            
-            if not second_diffs:
-                return 0
+            first_diffs = -np.diff(scores)
+            second_diffs = -np.diff(first_diffs)
             
             # Find significant changes in rate
-            mean_second_diff = np.mean(second_diffs)
-            std_second_diff = np.std(second_diffs)
+            mean_second_diff = second_diffs.mean()
+            std_second_diff = second_diffs.std()
             
             if std_second_diff == 0:
                 return 0
@@ -181,17 +177,17 @@ class ElbowAnalyzer:
             threshold = mean_second_diff + (sensitivity * std_second_diff)
             
             # Find first point where second derivative exceeds threshold
-            for i, diff in enumerate(second_diffs):
-                if diff > threshold:
-                    return i + 2  # +2 because of derivative calculations
+            exceeds = second_diffs > threshold
+            if not exceeds.any():
+                return 0
             
-            return 0
+            return int(np.argmax(exceeds)) + 2  # +2 because of derivative calculations
             
         except Exception as e:
             logger.error(f"Rate change detection failed: {e}")
             return 0
     
-    def _detect_percentage_drop_elbow(self, scores: List[float], drop_threshold: float = 0.3) -> int:
+    def _detect_percentage_drop_elbow(self, scores: np.ndarray, drop_threshold: float = 0.3) -> int:
         """
         Detect elbow by finding where similarity drops by a significant percentage
         """
@@ -201,23 +197,25 @@ class ElbowAnalyzer:
             
             first_score = scores[0]
             
-            for i in range(1, len(scores)):
-                if first_score > 0:
-                    percentage_drop = (first_score - scores[i]) / first_score
-                    if percentage_drop >= drop_threshold:
-                        return i
+            if first_score <= 0:
+                return 0
             
-            return 0
+            # Scores are descending, so the drops are ascending and the first
+            # one reaching the threshold can be found by binary search
+            percentage_drops = (first_score - scores[1:]) / first_score
+            i = int(np.searchsorted(percentage_drops, drop_threshold, side='left'))
+            
+            return i + 1 if i < percentage_drops.size else 0
             
         except Exception as e:
             logger.error(f"Percentage drop detection failed: {e}")
             return 0
     
-    def _adaptive_threshold_fallback(self, scores: List[float]) -> int:
+    def _adaptive_threshold_fallback(self, scores: np.ndarray) -> int:
         """
         Adaptive fallback that selects based on score distribution
         """
-        if not scores:
+        if len(scores) == 0:
             return self.min_docs
         
         # If scores are very uniform, take more documents
@@ -3,10 +3,10 @@ File processing service for handling file operations during indexing
 """
 
 import os
+import asyncio
 import hashlib
 import logging
-from typing import List, Dict, Any, Set
-from pathlib import Path
+from typing import List, Dict, Any, AsyncIterator, FrozenSet, Iterator, Optional, Tuple
 
 from app.services.storage import storage_service
 
@@ -17,7 +17,16 @@ class FileProcessingService:
     """Service for processing files during indexing"""
     
     # Define allowed documentation file extensions
-    DOCUMENTATION_EXTENSIONS: Set[str] = {'.md', '.mdx'}
+    DOCUMENTATION_EXTENSIONS: FrozenSet[str] = frozenset({'.md', '.mdx'})
+    
+    # Directories never searched for documentation
+    SKIPPED_DIRECTORIES: FrozenSet[str] = frozenset({'.git', 'node_modules'})
+    
+    # Maximum number of files read and uploaded concurrently
+    MAX_CONCURRENT_FILES = 16
+    
+    # Maximum number of concurrent downloads when re-indexing from storage
+    MAX_CONCURRENT_DOWNLOADS = 32
     
     @staticmethod
     async def process_files_from_disk(
@@ -36,44 +45,95 @@ class FileProcessingService:
         Returns:
             List of file data dictionaries
         """
-        files_data = []
+        files_data = [
+            file_data
+            async for file_data in FileProcessingService.iter_files_from_disk(
+                repo_path, docs_directory, repo_id
+            )
+        ]
+        
+        logger.info(f"Processed {len(files_data)} documentation files")
+        return files_data
+    
+    @staticmethod
+    async def iter_files_from_disk(
+        repo_path: str, 
+        docs_directory: str, 
+        repo_id: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process documentation files from a cloned repository, yielding each
+        file as soon as it has been read and uploaded
+        
+        Files are processed concurrently and yielded in completion order, so
+        later stages can start on the first files while the rest are uploading.
+        
+        Args:
+            repo_path: Path to the cloned repository
+            docs_directory: Directory containing documentation files
+            repo_id: Repository ID for storage keys
+            
+        Yields:
+            File data dictionaries
+        """
         docs_path = os.path.join(repo_path, docs_directory)
         
         if not os.path.exists(docs_path):
             logger.warning(f"Documentation directory {docs_path} does not exist")
-            return files_data
+            return
 
         logger.info(f"Processing files from directory: {docs_path}")
         
-        # Walk through the directory
-        for root, dirs, files in os.walk(docs_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                relative_path = os.path.relpath(file_path, docs_path)
-                
-                # Check if file has documentation extension
-                if not FileProcessingService._is_documentation_file(file_path):
-                    continue
-                
-                # Skip binary files
-                if FileProcessingService._is_binary_file(file_path):
-                    logger.info(f"Skipping binary file: {relative_path}")
-                    continue
-                
+        # Collect candidate files first so they can be processed concurrently
+        candidates = []
+        for entry in FileProcessingService._walk_files(docs_path):
+            # Check if file has documentation extension
+            if not FileProcessingService._is_documentation_file(entry.name):
+                continue
+            
+            file_path = entry.path
+            relative_path = os.path.relpath(file_path, docs_path)
+            
+            # Skip binary files
+            if FileProcessingService._is_binary_file(file_path):
+                logger.info(f"Skipping binary file: {relative_path}")
+                continue
+            
+            candidates.append((file_path, relative_path))
+        
+        # Files whose stored content already matches are not uploaded again
+        stored_hashes = await FileProcessingService._get_stored_content_hashes(repo_id)
+        
+        # Reads, hashing and uploads block, so they run on worker threads with
+        # a cap on how many files are in flight at once
+        semaphore = asyncio.Semaphore(FileProcessingService.MAX_CONCURRENT_FILES)
+        
+        async def process_with_semaphore(file_path: str, relative_path: str):
+            async with semaphore:
                 try:
-                    file_data = await FileProcessingService._process_single_file(
-                        file_path, relative_path, repo_id
+                    return await FileProcessingService._process_single_file(
+                        file_path, relative_path, repo_id, stored_hashes.get(relative_path)
                     )
-                    if file_data:
-                        files_data.append(file_data)
-                        logger.info(f"Processed documentation file: {relative_path} ({len(file_data['content'])} chars)")
-                        
                 except (UnicodeDecodeError, OSError) as e:
                     logger.warning(f"Skipping unreadable file {relative_path}: {e}")
-                    continue
+                    return None
         
-        logger.info(f"Processed {len(files_data)} documentation files")
-        return files_data
+        tasks = [
+            asyncio.create_task(process_with_semaphore(file_path, relative_path))
+            for file_path, relative_path in candidates
+        ]
+        
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                file_data = await next_done
+                if file_data:
+                    logger.info(f"Processed documentation file: {file_data['path']} ({len(file_data['content'])} chars)")
+                    yield file_data
+        finally:
+            # Don't leave uploads running if the consumer stops early or fails
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
     
     @staticmethod
     async def process_files_from_storage(repo_id: str) -> List[Dict[str, Any]]:
@@ -101,25 +161,36 @@ class FileProcessingService:
         
         logger.info(f"Processing {len(files)} existing files from storage")
         
-        # Process existing files and prepare them for re-chunking
-        for file in files:
-            try:
-                content = await FileProcessingService._get_file_content_from_storage(file)
-                if not content:
-                    logger.warning(f"Could not fetch content for file {file.path}. Skipping.")
-                    continue
-                
-                # Add to files_data with existing metadata
-                files_data.append({
-                    'path': file.path,
-                    'content': content,
-                    'content_hash': file.content_hash,
-                    'storage_key': file.storage_key,
-                    'repo_id': repo_id
-                })
-                
-            except Exception as e:
-                logger.error(f"Error processing file {file.path}: {e}")
+        # Fetch existing files concurrently, capped so the storage endpoint isn't flooded
+        semaphore = asyncio.Semaphore(FileProcessingService.MAX_CONCURRENT_DOWNLOADS)
+        
+        async def fetch_with_semaphore(file):
+            async with semaphore:
+                return await FileProcessingService._get_file_content_from_storage(file)
+        
+        contents = await asyncio.gather(
+            *(fetch_with_semaphore(file) for file in files),
+            return_exceptions=True
+        )
+        
+        # Prepare existing files for re-chunking
+        for file, content in zip(files, contents):
+            if isinstance(content, Exception):
+                logger.error(f"Error processing file {file.path}: {content}")
+                continue
+            
+            if not content:
+                logger.warning(f"Could not fetch content for file {file.path}. Skipping.")
+                continue
+            
+            # Add to files_data with existing metadata
+            files_data.append({
+                'path': file.path,
+                'content': content,
+                'content_hash': file.content_hash,
+                'storage_key': file.storage_key,
+                'repo_id': repo_id
+            })
         
         logger.info(f"Successfully processed {len(files_data)} files from storage")
         return files_data
@@ -128,24 +199,37 @@ class FileProcessingService:
     async def _process_single_file(
         file_path: str, 
         relative_path: str, 
-        repo_id: str
+        repo_id: str,
+        stored_hash: Optional[Tuple[str, str]] = None
     ) -> Dict[str, Any]:
-        """Process a single file and upload to storage"""
-        # Read file content
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        """
+        Process a single file and upload to storage
         
-        # Calculate content hash
-        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        Args:
+            file_path: Absolute path of the file on disk
+            relative_path: Path relative to the documentation directory
+            repo_id: Repository ID for storage keys
+            stored_hash: (content_hash, storage_key) of the existing file record, if any
+        """
+        raw_content, content, content_hash = await asyncio.to_thread(
+            FileProcessingService._read_file, file_path
+        )
         
-        # Upload to storage
         storage_key = f"docs/{repo_id}/{relative_path}"
-        success = storage_service.upload_document(
-            repo_id=repo_id,
-            file_path=relative_path,
-            content=content.encode('utf-8'),
-            force_update=True
-        )
+        
+        # Storage already holds this exact content; uploading it again is wasted work
+        if stored_hash == (content_hash, storage_key):
+            logger.debug(f"Skipping upload of unchanged file: {relative_path}")
+            success = True
+        else:
+            # Upload to storage
+            success = await asyncio.to_thread(
+                storage_service.upload_document,
+                repo_id=repo_id,
+                file_path=relative_path,
+                content=raw_content,
+                force_update=True
+            )
         
         if not success:
             logger.error(f"Failed to upload {relative_path} to storage")
@@ -159,6 +243,41 @@ class FileProcessingService:
             'repo_id': repo_id
         }
     
+    @staticmethod
+    async def _get_stored_content_hashes(repo_id: str) -> Dict[str, Tuple[str, str]]:
+        """
+        Get the content hash and storage key of every stored file in a repository
+        
+        Returns:
+            Dict mapping file path to (content_hash, storage_key)
+        """
+        from app.database import prisma
+        
+        files = await prisma.file.find_many(where={"repo_id": repo_id})
+        return {file.path: (file.content_hash, file.storage_key) for file in files}
+    
+    @staticmethod
+    def _read_file(file_path: str) -> Tuple[bytes, str, str]:
+        """
+        Read a file and calculate its content hash
+        
+        Returns:
+            Tuple of (raw_content, content, content_hash)
+        """
+        # Read raw bytes so hashing and upload don't need to re-encode the text
+        with open(file_path, 'rb') as f:
+            raw_content = f.read()
+        content = raw_content.decode('utf-8')
+        
+        # Normalize line endings the way text mode reading would
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+            raw_content = content.encode('utf-8')
+        
+        # Calculate content hash
+        content_hash = hashlib.sha256(raw_content).hexdigest()
+        return raw_content, content, content_hash
+    
     @staticmethod
     async def _get_file_content_from_storage(file) -> str:
         """Get file content from storage"""
@@ -171,18 +290,45 @@ class FileProcessingService:
         content = await storage_service.get_file_content('docs', storage_path)
         return content
     
+    @staticmethod
+    def _walk_files(root_path: str) -> Iterator[os.DirEntry]:
+        """
+        Yield every file below a directory
+        
+        Like os.walk without following directory symlinks, but yields the
+        scandir entries directly instead of building name lists per directory,
+        and never descends into SKIPPED_DIRECTORIES.
+        """
+        pending_dirs = [root_path]
+        while pending_dirs:
+            try:
+                with os.scandir(pending_dirs.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            if not entry.is_symlink() and entry.name not in FileProcessingService.SKIPPED_DIRECTORIES:
+                                pending_dirs.append(entry.path)
+                        else:
+                            yield entry
+            except OSError as e:
+                logger.warning(f"Skipping unreadable directory: {e}")
+    
     @staticmethod
     def _is_documentation_file(file_path: str) -> bool:
         """Check if file is a documentation file based on extension"""
-        file_ext = Path(file_path).suffix.lower()
+        file_ext = os.path.splitext(file_path)[1].lower()
         return file_ext in FileProcessingService.DOCUMENTATION_EXTENSIONS
     
     @staticmethod
     def _is_binary_file(file_path: str) -> bool:
         """Check if file is binary"""
+        # A raw descriptor avoids building a buffered file object just to sniff the head
         try:
-            with open(file_path, 'rb') as f:
-                chunk = f.read(1024)
-                return b'\0' in chunk
+            fd = os.open(file_path, os.O_RDONLY)
+            try:
+                chunk = os.read(fd, 1024)
+            finally:
+                os.close(fd)
         except OSError:
             return True
+        
+        return b'\0' in chunk
@@ -6,6 +6,7 @@ import os
 import tempfile
 import shutil
 import logging
+from contextlib import aclosing
 from typing import Dict, Any, Optional
 
 from app.services.job_service import JobService
@@ -33,7 +34,8 @@ class IndexingOrchestrator:
         branch: str,
         docs_directory: str,
         github_access_token: Optional[str] = None,
-        soft_reindex: bool = False
+        soft_reindex: bool = False,
+        force_reembed: bool = False
     ) -> Dict[str, Any]:
         """
         Run the complete indexing workflow
@@ -44,6 +46,7 @@ class IndexingOrchestrator:
             docs_directory: Directory containing documentation
             github_access_token: Optional GitHub access token
             soft_reindex: Whether to perform soft reindex (use existing files)
+            force_reembed: Re-run chunking and storage even if nothing changed since the last sync
             
         Returns:
             Dict with indexing results
@@ -54,35 +57,43 @@ class IndexingOrchestrator:
             # Step 1: Starting
             await self._update_progress('starting', 0)
             
-            # Step 2: Process files (clone or fetch from storage)
+            # Steps 2-3: Process files (clone or fetch from storage), then
+            # generate chunks and embeddings
             if not soft_reindex:
-                files_data, temp_dir = await self._process_hard_reindex(
-                    github_full_name, branch, docs_directory, github_access_token
+                # Create temporary directory for git operations; created here so
+                # it is cleaned up even if chunking fails partway through
+                temp_dir = tempfile.mkdtemp(prefix="doccelerate_index_")
+                logger.info(f"Created temporary directory: {temp_dir}")
+                
+                files_data, chunks_data = await self._process_hard_reindex(
+                    github_full_name, branch, docs_directory, github_access_token, temp_dir,
+                    force_reembed
                 )
             else:
                 files_data = await self._process_soft_reindex()
+                
+                await self._update_progress('generating_embeddings', 60)
+                chunks_data = await ChunkService.process_chunks_for_files(files_data)
             
-            # Step 3: Generate chunks and embeddings
-            await self._update_progress('generating_embeddings', 60)
-            chunks_data = await ChunkService.process_chunks_for_files(files_data)
-            
-            # Step 4: Store in database
-            await self._update_progress('storing_data', 80)
-            await DatabaseService.store_files_and_chunks(
-                self.repo_id, files_data, chunks_data, soft_reindex
-            )
-            
-            # Step 5: Calculate and store Merkle tree
-            await self._update_progress('merkle_tree', 90)
-            root_hash = await MerkleTreeService.calculate_and_store_merkle_tree(
-                self.repo_id, files_data
-            )
-            
-            # Step 6: Update repository with sync info
-            commit_sha = await self._get_commit_sha(temp_dir, soft_reindex)
-            await DatabaseService.update_repository_sync_info(
-                self.repo_id, commit_sha, root_hash
-            )
+            # No chunks means the stored index already matches this commit
+            if chunks_data is not None:
+                # Step 4: Store in database
+                await self._update_progress('storing_data', 80)
+                await DatabaseService.store_files_and_chunks(
+                    self.repo_id, files_data, chunks_data, soft_reindex
+                )
+                
+                # Step 5: Calculate and store Merkle tree
+                await self._update_progress('merkle_tree', 90)
+                root_hash = await MerkleTreeService.calculate_and_store_merkle_tree(
+                    self.repo_id, files_data
+                )
+                
+                # Step 6: Update repository with sync info
+                commit_sha = await self._get_commit_sha(temp_dir, soft_reindex)
+                await DatabaseService.update_repository_sync_info(
+                    self.repo_id, commit_sha, root_hash
+                )
             
             # Step 7: Send notification
             await self._update_progress('notifying', 95)
@@ -93,7 +104,7 @@ class IndexingOrchestrator:
             return {
                 'status': 'completed',
                 'files_processed': len(files_data),
-                'chunks_created': len(chunks_data),
+                'chunks_created': len(chunks_data) if chunks_data is not None else 0,
                 'repo_id': self.repo_id,
                 'soft_reindex': soft_reindex
             }
@@ -122,26 +133,60 @@ class IndexingOrchestrator:
         github_full_name: str,
         branch: str,
         docs_directory: str,
-        github_access_token: Optional[str]
+        github_access_token: Optional[str],
+        temp_dir: str,
+        force_reembed: bool = False
     ) -> tuple:
-        """Process hard reindex (clone repo and process files)"""
-        # Create temporary directory for git operations
-        temp_dir = tempfile.mkdtemp(prefix="doccelerate_index_")
-        logger.info(f"Created temporary directory: {temp_dir}")
+        """
+        Process hard reindex (clone repo, process files and generate chunks)
         
+        Files are chunked and embedded as soon as each one has been uploaded,
+        rather than after every file has been processed. If the clone is the
+        commit that was last synced and its documentation files match the
+        stored ones, chunking is skipped and chunks_data is returned as None.
+        """
         # Step 2a: Clone repository
         await self._update_progress('cloning', 10)
         repo_path = await RepositoryService.clone_repository(
             github_full_name, branch, docs_directory, temp_dir, github_access_token
         )
         
-        # Step 2b: Process files
         await self._update_progress('processing_files', 30)
-        files_data = await FileProcessingService.process_files_from_disk(
-            repo_path, docs_directory, self.repo_id
-        )
         
-        return files_data, temp_dir
+        # Re-indexing the last synced commit only needs new embeddings if the
+        # indexed files differ (another docs directory, or edits made in the app)
+        commit_sha = RepositoryService.get_commit_sha(repo_path)
+        if not force_reembed and commit_sha == await self._get_last_sync_sha():
+            files_data = await FileProcessingService.process_files_from_disk(
+                repo_path, docs_directory, self.repo_id
+            )
+            
+            if await self._is_index_current(files_data):
+                logger.info(f"Commit {commit_sha[:8]} is already indexed, skipping chunking and storage")
+                return files_data, None
+            
+            await self._update_progress('generating_embeddings', 60, files_count=len(files_data))
+            chunks_data = await ChunkService.process_chunks_for_files(files_data)
+            return files_data, chunks_data
+        
+        # Step 2b: Process files, streaming each one into chunking and embedding
+        files_data = []
+        
+        async def stream_files():
+            files = FileProcessingService.iter_files_from_disk(repo_path, docs_directory, self.repo_id)
+            async with aclosing(files):
+                async for file_data in files:
+                    files_data.append(file_data)
+                    yield file_data
+            
+            # Every file is uploaded; only chunks still in the pipeline remain
+            logger.info(f"Processed {len(files_data)} documentation files")
+            await self._update_progress('generating_embeddings', 60, files_count=len(files_data))
+        
+        # Step 3: Generate chunks and embeddings
+        chunks_data = await ChunkService.process_chunks_for_files(stream_files())
+        
+        return files_data, chunks_data
     
     async def _process_soft_reindex(self):
         """Process soft reindex (use existing files from storage)"""
@@ -161,9 +206,31 @@ class IndexingOrchestrator:
             return RepositoryService.get_commit_sha(repo_path)
         else:
             # For soft re-indexing, keep the existing commit SHA
-            from app.database import prisma
-            repo = await prisma.repo.find_unique(where={"id": self.repo_id})
-            return repo.last_sync_sha if repo else None
+            return await self._get_last_sync_sha()
+    
+    async def _get_last_sync_sha(self) -> Optional[str]:
+        """Get the commit SHA recorded by the last completed indexing run"""
+        from app.database import prisma
+        repo = await prisma.repo.find_unique(where={"id": self.repo_id})
+        return repo.last_sync_sha if repo else None
+    
+    async def _is_index_current(self, files_data: list) -> bool:
+        """
+        Check whether the stored index already covers exactly these files
+        
+        The Merkle tree only changes when the repository is re-indexed, so
+        the stored file records are compared as well to catch edits made
+        in the app since then.
+        """
+        if not await MerkleTreeService.compare_merkle_trees(self.repo_id, files_data):
+            return False
+        
+        from app.database import prisma
+        stored_files = await prisma.file.find_many(where={"repo_id": self.repo_id})
+        
+        stored_hashes = {file.path: file.content_hash for file in stored_files}
+        current_hashes = {file_data['path']: file_data['content_hash'] for file_data in files_data}
+        return stored_hashes == current_hashes
     
     async def _update_progress(
         self, 
@@ -2,8 +2,9 @@
 Job management service for handling query processing jobs
 """
 
-import json
 import logging
+import orjson
+from datetime import datetime, timezone
 from typing import Optional
 
 from app.database import get_db
@@ -23,42 +24,41 @@ class JobService:
         step: Optional[str] = None, 
         error_msg: Optional[str] = None
     ) -> None:
-        """Update job progress in database"""
+        """
+        Update job progress in database
+        
+        Status, progress, error and step are written with one statement; the
+        step is merged into the jsonb metadata by Postgres, so the existing
+        metadata never has to be read first. String-encoded metadata from
+        older rows is decoded before the merge, never overwritten.
+        """
         try:
             async with get_db() as db:
-                update_data = {
-                    "status": status,
-                    "updated_at": None  # Will use default
-                }
-                
-                if progress is not None:
-                    update_data["progress"] = progress / 100.0  # Convert to 0.0-1.0 range
-                    
-                if error_msg:
-                    update_data["error_msg"] = error_msg
-                    
-                # Update metadata with current step if provided
-                if step:
-                    existing_job = await db.job.find_unique(
-                        where={"task_id": task_id}
-                    )
-                    if existing_job and existing_job.metadata:
-                        # Parse existing JSON metadata
-                        try:
-                            metadata = json.loads(existing_job.metadata) if isinstance(existing_job.metadata, str) else existing_job.metadata
-                        except (json.JSONDecodeError, TypeError):
-                            metadata = {}
-                        
-                        metadata["current_step"] = step
-                        update_data["metadata"] = json.dumps(metadata)
-                    elif step:
-                        # Create metadata if it doesn't exist
-                        update_data["metadata"] = json.dumps({"current_step": step})
-                
-                await db.job.update(
-                    where={"task_id": task_id},
-                    data=update_data
+                updated = await db.execute_raw(
+                    """
+                    UPDATE public.job
+                    SET status = $2::public.job_status,
+                        progress = COALESCE($3::real, progress),
+                        error_msg = COALESCE($4, error_msg),
+                        metadata = CASE
+                            WHEN $5::jsonb IS NULL THEN metadata
+                            WHEN metadata IS NULL OR jsonb_typeof(metadata) = 'null' THEN $5::jsonb
+                            -- Older rows hold the metadata as a JSON-encoded string
+                            WHEN jsonb_typeof(metadata) = 'string' THEN (metadata #>> '{}')::jsonb || $5::jsonb
+                            ELSE metadata || $5::jsonb
+                        END,
+                        updated_at = NOW()
+                    WHERE task_id = $1
+                    """,
+                    task_id,
+                    status,
+                    progress / 100.0 if progress is not None else None,  # Convert to 0.0-1.0 range
+                    error_msg or None,
+                    orjson.dumps({"current_step": step}).decode() if step else None
                 )
+                
+                if not updated:
+                    logger.error(f"Failed to update job progress: job {task_id} not found")
             
         except Exception as e:
             logger.error(f"Failed to update job progress: {e}")
@@ -71,43 +71,47 @@ class JobService:
         suggestions_created: int, 
         message: str
     ) -> None:
-        """Update job metadata with completion information"""
+        """
+        Update job metadata with completion information
+        
+        The completion fields are merged into the jsonb metadata in the same
+        statement that reads back repo_id, instead of fetching the job first.
+        """
         try:
             async with get_db() as db:
-                # Get existing job metadata
-                existing_job = await db.job.find_unique(
-                    where={"task_id": task_id}
-                )
+                completion = {
+                    "completion_message": message,
+                    "suggestions_created": suggestions_created,
+                    "completed_at": datetime.now(timezone.utc).isoformat(),  # Always changes the row, so the UPDATE event fires
+                }
                 
-                if existing_job and existing_job.metadata:
-                    # Parse existing metadata
-                    try:
-                        metadata = json.loads(existing_job.metadata) if isinstance(existing_job.metadata, str) else existing_job.metadata
-                    except (json.JSONDecodeError, TypeError):
-                        metadata = {}
-                else:
-                    metadata = {}
+                logger.debug(f"Job metadata for completion: {completion}")
                 
                 # Add completion info to metadata (preserve existing repo_id if it exists)
-                metadata.update({
-                    "completion_message": message,
-                    "suggestions_created": suggestions_created,
-                    "completed_at": json.dumps({"timestamp": "now"}),  # This will trigger the UPDATE event
-                })
+                updated = await db.query_first(
+                    """
+                    UPDATE public.job
+                    SET metadata = CASE
+                        WHEN metadata IS NULL OR jsonb_typeof(metadata) = 'null' THEN $2::jsonb
+                        -- Older rows hold the metadata as a JSON-encoded string
+                        WHEN jsonb_typeof(metadata) = 'string' THEN (metadata #>> '{}')::jsonb || $2::jsonb
+                        ELSE metadata || $2::jsonb
+                    END
+                    WHERE task_id = $1
+                    RETURNING metadata->>'repo_id' AS repo_id
+                    """,
+                    task_id,
+                    orjson.dumps(completion).decode()
+                )
+                
+                if not updated:
+                    logger.error(f"Failed to update job completion metadata: job {task_id} not found")
+                    return
                 
                 # Ensure repo_id is in metadata (it should already be there from job creation)
-                if not metadata.get("repo_id"):
+                if not updated.get("repo_id"):
                     logger.warning(f"repo_id not found in job metadata for task {task_id}")
                 
-                logger.debug(f"Job metadata for completion: {metadata}")
-                
-                await db.job.update(
-                    where={"task_id": task_id},
-                    data={
-                        "metadata": json.dumps(metadata)
-                    }
-                )
-                
                 logger.info(f"Updated job completion metadata for task {task_id}: {suggestions_created} suggestions")
             
         except Exception as e:
@@ -3,6 +3,7 @@ Merkle tree service for calculating and storing repository file hashes
 """
 
 import os
+import asyncio
 import hashlib
 import logging
 from typing import List, Dict, Any
@@ -15,6 +16,9 @@ logger = logging.getLogger(__name__)
 class MerkleTreeService:
     """Service for handling Merkle tree operations"""
     
+    # Number of Merkle node rows written per INSERT statement
+    NODE_BATCH_SIZE = 1000
+    
     @staticmethod
     async def calculate_and_store_merkle_tree(
         repo_id: str, 
@@ -32,11 +36,12 @@ class MerkleTreeService:
         """
         logger.info(f"Calculating Merkle tree for {len(files_data)} files")
         
-        # Calculate root hash
-        root_hash = MerkleTreeService._calculate_root_hash(files_data)
-        
-        # Store Merkle nodes
-        await MerkleTreeService._store_merkle_nodes(repo_id, files_data)
+        # Calculate the root hash on a worker thread while the nodes are stored,
+        # so hashing a large tree neither blocks the event loop nor waits on the DB
+        root_hash, _ = await asyncio.gather(
+            asyncio.to_thread(MerkleTreeService._calculate_root_hash, files_data),
+            MerkleTreeService._store_merkle_nodes(repo_id, files_data)
+        )
         
         logger.info(f"Calculated Merkle tree root hash: {root_hash[:8]}...")
         return root_hash
@@ -46,7 +51,9 @@ class MerkleTreeService:
         """
         Calculate the root hash of the Merkle tree
         
-        This is a simple implementation: hash of all file hashes sorted by path
+        Each file is a leaf hashing its path and raw content digest; leaves are
+        ordered by path and combined pairwise, level by level, until a single
+        root remains. An unpaired node at the end of a level moves up as is.
         
         Args:
             files_data: List of file data dictionaries
@@ -60,12 +67,24 @@ class MerkleTreeService:
             for file_data in files_data
         ])
         
-        # Create combined hash
-        combined = ''.join([f"{path}:{hash}" for path, hash in file_hashes])
-        root_hash = hashlib.sha256(combined.encode('utf-8')).hexdigest()
+        if not file_hashes:
+            return hashlib.sha256(b'').hexdigest()
         
-        logger.debug(f"Combined hash string length: {len(combined)} chars")
-        return root_hash
+        level = [
+            hashlib.sha256(path.encode('utf-8') + b'\x00' + bytes.fromhex(file_hash)).digest()
+            for path, file_hash in file_hashes
+        ]
+        
+        while len(level) > 1:
+            next_level = [
+                hashlib.sha256(level[i] + level[i + 1]).digest()
+                for i in range(0, len(level) - 1, 2)
+            ]
+            if len(level) % 2:
+                next_level.append(level[-1])
+            level = next_level
+        
+        return level[0].hex()
     
     @staticmethod
     async def _store_merkle_nodes(
@@ -75,6 +94,9 @@ class MerkleTreeService:
         """
         Store Merkle tree nodes in the database
         
+        Nodes are upserted with one statement per batch instead of one
+        round trip per file, then leaves for removed files are deleted.
+        
         Args:
             repo_id: Repository ID
             files_data: List of file data dictionaries
@@ -87,55 +109,47 @@ class MerkleTreeService:
             for file_data in files_data
         ])
         
-        # Store each file as a Merkle node
-        for path, file_hash in file_hashes:
+        for i in range(0, len(file_hashes), MerkleTreeService.NODE_BATCH_SIZE):
+            batch = file_hashes[i:i + MerkleTreeService.NODE_BATCH_SIZE]
             try:
-                await MerkleTreeService._upsert_merkle_node(repo_id, path, file_hash)
+                await prisma.execute_raw(
+                    """
+                    INSERT INTO public.merkle_node (repo_id, path, hash, node_type, parent_path)
+                    SELECT $1::uuid, path, hash, 'file', NULLIF(parent_path, '')
+                    FROM UNNEST($2::text[], $3::text[], $4::text[]) AS t(path, hash, parent_path)
+                    ON CONFLICT (repo_id, path) DO UPDATE
+                    SET hash = EXCLUDED.hash,
+                        parent_path = EXCLUDED.parent_path
+                    """,
+                    repo_id,
+                    [path for path, _ in batch],
+                    [file_hash for _, file_hash in batch],
+                    [os.path.dirname(path) for path, _ in batch]
+                )
             except Exception as e:
-                logger.error(f"Failed to store Merkle node for {path}: {e}")
+                logger.error(f"Failed to store {len(batch)} Merkle nodes: {e}")
                 raise
         
-        logger.info("Successfully stored all Merkle tree nodes")
-    
-    @staticmethod
-    async def _upsert_merkle_node(
-        repo_id: str, 
-        path: str, 
-        file_hash: str
-    ) -> None:
-        """
-        Upsert a single Merkle tree node
-        
-        Args:
-            repo_id: Repository ID
-            path: File path
-            file_hash: File content hash
-        """
-        parent_path = os.path.dirname(path) if os.path.dirname(path) else None
-        
-        await prisma.merkle_node.upsert(
-            where={
-                "repo_id_path": {
-                    "repo_id": repo_id,
-                    "path": path
-                }
-            },
-            data={
-                "create": {
-                    "repo_id": repo_id,
-                    "path": path,
-                    "hash": file_hash,
-                    "node_type": "file",
-                    "parent_path": parent_path
-                },
-                "update": {
-                    "hash": file_hash,
-                    "parent_path": parent_path
-                }
-            }
-        )
+        # Drop leaves for files that no longer exist so later comparisons
+        # only see the current tree
+        try:
+            removed = await prisma.execute_raw(
+                """
+                DELETE FROM public.merkle_node
+                WHERE repo_id = $1::uuid
+                  AND node_type = 'file'
+                  AND path <> ALL($2::text[])
+                """,
+                repo_id,
+                [path for path, _ in file_hashes]
+            )
+            if removed:
+                logger.info(f"Removed {removed} stale Merkle nodes")
+        except Exception as e:
+            logger.error(f"Failed to remove stale Merkle nodes: {e}")
+            raise
         
-        logger.debug(f"Upserted Merkle node: {path}")
+        logger.info("Successfully stored all Merkle tree nodes")
     
     @staticmethod
     async def get_repository_merkle_hash(repo_id: str) -> str:
@@ -149,10 +163,7 @@ class MerkleTreeService:
             Current root hash or None if not found
         """
         try:
-            repo = await prisma.repo.find_unique(
-                where={"id": repo_id},
-                select={"root_hash": True}
-            )
+            repo = await prisma.repo.find_unique(where={"id": repo_id})
             
             if repo and repo.root_hash:
                 return repo.root_hash
@@ -179,17 +190,17 @@ class MerkleTreeService:
             True if trees are identical, False otherwise
         """
         try:
-            # Calculate new root hash
-            new_root_hash = MerkleTreeService._calculate_root_hash(new_files_data)
-            
-            # Get existing root hash
-            existing_root_hash = await MerkleTreeService.get_repository_merkle_hash(repo_id)
+            # Leaves carry each file's content hash, so comparing them directly
+            # answers the question without rebuilding the tree
+            existing_leaves = await MerkleTreeService._fetch_existing_leaf_map(repo_id)
             
-            if not existing_root_hash:
+            if not existing_leaves:
                 logger.info("No existing Merkle tree found for comparison")
                 return False
             
-            is_identical = new_root_hash == existing_root_hash
+            new_leaves = {file_data['path']: file_data['content_hash'] for file_data in new_files_data}
+            
+            is_identical = new_leaves == existing_leaves
             logger.info(f"Merkle tree comparison: {'identical' if is_identical else 'different'}")
             
             return is_identical
@@ -197,3 +208,16 @@ class MerkleTreeService:
         except Exception as e:
             logger.error(f"Failed to compare Merkle trees: {e}")
             return False
+    
+    @staticmethod
+    async def _fetch_existing_leaf_map(repo_id: str) -> Dict[str, str]:
+        """
+        Get the stored file leaves of a repository's Merkle tree
+        
+        Returns:
+            Dict mapping file path to content hash
+        """
+        nodes = await prisma.merkle_node.find_many(
+            where={"repo_id": repo_id, "node_type": "file"}
+        )
+        return {node.path: node.hash for node in nodes}
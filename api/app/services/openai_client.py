@@ -3,8 +3,13 @@ OpenAI service for embedding and AI operations
 """
 
 import asyncio
-from typing import List, Optional, Dict, Any
+import random
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import accumulate
+from typing import List, Optional, Dict, Any, Tuple
 from openai import AsyncOpenAI
+import orjson
 import tiktoken
 import re
 import logging
@@ -14,6 +19,40 @@ from app.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Postgres LIKE meta-characters, escaped in keyword fallback patterns
+_LIKE_META_RE = re.compile(r'([%_])')
+
+# UTF-8 continuation bytes, which a token split mid-character can start with
+_UTF8_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+
+# Upper bound on a single retry backoff, in seconds
+_MAX_RETRY_DELAY = 30.0
+
+
+def _retry_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """
+    Seconds to wait before retrying a failed OpenAI request
+    
+    Honors the Retry-After header of rate limit responses; otherwise uses
+    exponential backoff with full jitter so concurrent retries spread out.
+    
+    Args:
+        attempt: Zero-based index of the attempt that failed
+        error: Exception raised by the attempt, if any
+        
+    Returns:
+        Delay in seconds
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), _MAX_RETRY_DELAY)
+        except ValueError:
+            pass  # HTTP-date form, fall back to backoff
+    
+    return random.uniform(0, min(_MAX_RETRY_DELAY, 2 ** attempt))
+
 class OpenAIService:
     """
     OpenAI service for handling embeddings and AI model interactions
@@ -25,6 +64,9 @@ class OpenAIService:
         self._embedding_dimensions = 1536
         self._encoding = tiktoken.get_encoding("cl100k_base")
         self._chat_model = "gpt-5-mini"
+        # Recent query embeddings keyed by (model, text), oldest first
+        self._query_embedding_cache: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._query_embedding_cache_size = 256
     
     @property
     def client(self) -> AsyncOpenAI:
@@ -58,6 +100,24 @@ class OpenAIService:
         """
         return len(self._encoding.encode(text))
     
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        """
+        Count the number of tokens in several text strings at once
+        
+        Texts are encoded in parallel threads by tiktoken.
+        
+        Args:
+            texts: Input texts to count tokens for
+            
+        Returns:
+            Number of tokens per text, in input order
+        """
+        if not texts:
+            return []
+        
+        encoded = self._encoding.encode_ordinary_batch(texts, num_threads=min(len(texts), 8))
+        return [len(tokens) for tokens in encoded]
+    
     def split_text_by_tokens(self, text: str, max_tokens: int = 1000, overlap_tokens: int = 100) -> List[str]:
         """
         Split text into chunks based on token count with overlap
@@ -70,7 +130,7 @@ class OpenAIService:
         Returns:
             List of text chunks
         """
-        tokens = self._encoding.encode(text)
+        tokens = self._encoding.encode_ordinary(text)
         chunks = []
         
         start = 0
@@ -79,8 +139,9 @@ class OpenAIService:
             
             # Try to find a good breaking point (sentence boundary)
             if end < len(tokens):
-                chunk_tokens = tokens[start:end]
-                chunk_text = self._encoding.decode(chunk_tokens)
+                token_bytes = self._encoding.decode_tokens_bytes(tokens[start:end])
+                chunk_bytes = b''.join(token_bytes)
+                chunk_text = chunk_bytes.decode('utf-8', errors='replace')
                 
                 # Look for sentence boundaries in the last 20% of the chunk
                 last_part = chunk_text[-len(chunk_text)//5:]
@@ -93,9 +154,14 @@ class OpenAIService:
                         best_break = pos
                 
                 if best_break > 0:
-                    # Adjust end to the sentence boundary
-                    adjusted_end = start + len(self._encoding.encode(chunk_text[:-len(last_part) + best_break + 1]))
-                    end = min(adjusted_end, len(tokens))
+                    # Adjust end to the token covering the sentence boundary, found
+                    # from the token byte offsets rather than re-encoding the prefix
+                    prefix = chunk_text[:len(chunk_text) - len(last_part) + best_break + 1]
+                    # Each stray continuation byte at the chunk start decoded to a 3-byte U+FFFD
+                    stray = len(chunk_bytes) - len(chunk_bytes.lstrip(_UTF8_CONTINUATION_BYTES))
+                    boundary = len(prefix.encode('utf-8')) - 2 * stray
+                    token_ends = list(accumulate(map(len, token_bytes)))
+                    end = start + bisect_left(token_ends, boundary) + 1
             
             chunk_tokens = tokens[start:end]
             chunk_text = self._encoding.decode(chunk_tokens)
@@ -130,14 +196,24 @@ class OpenAIService:
             print(f"Failed to generate embedding for text: {e}")
             return None
     
-    async def generate_embeddings_batch(self, texts: List[str], model: Optional[str] = None, batch_size: int = 100) -> List[Optional[List[float]]]:
+    async def generate_embeddings_batch(
+        self, 
+        texts: List[str], 
+        model: Optional[str] = None, 
+        batch_size: int = 100,
+        max_concurrency: int = 5
+    ) -> List[Optional[List[float]]]:
         """
         Generate embeddings for multiple texts in batches
         
+        Up to max_concurrency batch requests are in flight at once; rate limit
+        responses are retried per request by the OpenAI client.
+        
         Args:
             texts: List of input texts to embed
             model: OpenAI model to use (defaults to text-embedding-3-small)
             batch_size: Number of texts to process per API call
+            max_concurrency: Maximum number of batch requests in flight
             
         Returns:
             List of embedding vectors (None for failed embeddings)
@@ -145,30 +221,31 @@ class OpenAIService:
         if not texts:
             return []
         
-        results = []
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        semaphore = asyncio.Semaphore(max_concurrency)
         
-        # Process in batches to avoid API limits
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            
-            try:
-                response = await self._client.embeddings.create(
-                    input=batch,
-                    model=model or self._embedding_model
-                )
-                
-                # Extract embeddings from response
-                batch_embeddings = [item.embedding for item in response.data]
-                results.extend(batch_embeddings)
-                
-            except Exception as e:
-                print(f"Failed to generate embeddings for batch {i//batch_size + 1}: {e}")
-                # Add None for each failed embedding in the batch
-                results.extend([None] * len(batch))
-            
-            # Add a small delay between batches to respect rate limits
-            if i + batch_size < len(texts):
-                await asyncio.sleep(0.1)
+        async def _embed_batch(batch_index: int, batch: List[str]) -> List[Optional[List[float]]]:
+            async with semaphore:
+                try:
+                    response = await self._client.embeddings.create(
+                        input=batch,
+                        model=model or self._embedding_model
+                    )
+                    # Extract embeddings from response
+                    return [item.embedding for item in response.data]
+                except Exception as e:
+                    print(f"Failed to generate embeddings for batch {batch_index + 1}: {e}")
+                    # Add None for each failed embedding in the batch
+                    return [None] * len(batch)
+        
+        # gather keeps results in batch order
+        batch_results = await asyncio.gather(
+            *(_embed_batch(i, batch) for i, batch in enumerate(batches))
+        )
+        
+        results = []
+        for batch_embeddings in batch_results:
+            results.extend(batch_embeddings)
         
         return results
     
@@ -184,20 +261,53 @@ class OpenAIService:
         Returns:
             Embedding vector or None if all attempts failed
         """
+        if not text.strip():
+            return None
+        
         for attempt in range(max_retries + 1):
             try:
                 embedding = await self.generate_embedding(text, model)
                 if embedding is not None:
                     return embedding
+                if attempt < max_retries:
+                    await asyncio.sleep(_retry_delay(attempt))  # Jittered exponential backoff
             except Exception as e:
                 if attempt == max_retries:
                     print(f"Failed to generate embedding after {max_retries + 1} attempts: {e}")
                 else:
                     print(f"Embedding attempt {attempt + 1} failed, retrying: {e}")
-                    await asyncio.sleep(2 ** attempt)  # Exponential backoff
+                    await asyncio.sleep(_retry_delay(attempt, e))  # Jittered exponential backoff
         
         return None
     
+    async def generate_query_embedding(self, query: str, model: Optional[str] = None) -> Optional[List[float]]:
+        """
+        Generate embedding for a search query, reusing recently computed results
+        
+        Identical queries handled by the same worker process (resubmissions,
+        retries) skip the OpenAI round trip.
+        
+        Args:
+            query: Query text to embed
+            model: OpenAI model to use (defaults to text-embedding-3-small)
+            
+        Returns:
+            Embedding vector or None if all attempts failed
+        """
+        key = (model or self._embedding_model, query)
+        cached = self._query_embedding_cache.get(key)
+        if cached is not None:
+            self._query_embedding_cache.move_to_end(key)
+            return cached
+        
+        embedding = await self.generate_embedding_with_retry(query, model=model)
+        if embedding is not None:
+            self._query_embedding_cache[key] = embedding
+            if len(self._query_embedding_cache) > self._query_embedding_cache_size:
+                self._query_embedding_cache.popitem(last=False)
+        
+        return embedding
+    
     def get_fallback_embedding(self) -> List[float]:
         """
         Get a zero vector as fallback for failed embeddings
@@ -222,7 +332,10 @@ class OpenAIService:
         # Generate embeddings for all chunks
         embeddings = await self.generate_embeddings_batch(chunks)
         
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        # Count tokens for all chunks in one batched encode
+        token_counts = self.count_tokens_batch(chunks)
+        
+        for i, (chunk, embedding, token_count) in enumerate(zip(chunks, embeddings, token_counts)):
             # Use fallback embedding if generation failed
             if embedding is None:
                 print(f"Using fallback embedding for chunk {i}")
@@ -231,7 +344,7 @@ class OpenAIService:
             results.append({
                 'content': chunk,
                 'embedding': embedding,
-                'token_count': self.count_tokens(chunk),
+                'token_count': token_count,
                 'chunk_index': i
             })
         
@@ -352,10 +465,28 @@ class OpenAIService:
                     print(f"Failed to generate completion after {max_retries + 1} attempts: {e}")
                 else:
                     print(f"Completion attempt {attempt + 1} failed, retrying: {e}")
-                    await asyncio.sleep(2 ** attempt)  # Exponential backoff
+                    await asyncio.sleep(_retry_delay(attempt, e))  # Retry-After or jittered exponential backoff
         
         return None
 
+    @staticmethod
+    def _to_chunk_results(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Turn chunk search rows into result dictionaries
+        
+        The raw queries already select exactly the result fields, so the row
+        dictionaries are reused and only the similarity is normalized.
+        
+        Args:
+            rows: Rows returned by a chunk search query
+            
+        Returns:
+            The same rows with similarity as a float
+        """
+        for row in rows:
+            row['similarity'] = float(row.get('similarity') or 0.0)  # Handle None case
+        return rows
+    
     async def search_similar_chunks(
         self, 
         query_embedding: List[float], 
@@ -378,8 +509,9 @@ class OpenAIService:
         try:
             from app.database import get_db
             
-            # Convert embedding to string format for pgvector
-            embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
+            # Convert embedding to string format for pgvector; a JSON float array
+            # is a valid vector literal and orjson formats it in C
+            embedding_str = orjson.dumps(query_embedding).decode()
             
             # Query using raw SQL for pgvector similarity search
             query = """
@@ -413,23 +545,7 @@ class OpenAIService:
                     limit           # $4
                 )
 
-                # Convert results to list of dictionaries
-                similar_chunks = []
-                for row in results:
-                    similar_chunks.append({
-                        'hash': row.get('hash'),
-                        'content': row.get('content'),
-                        'token_count': row.get('token_count'),
-                        'file_id': row.get('file_id'),
-                        'file_path': row.get('file_path'),
-                        'storage_key': row.get('storage_key'),
-                        'chunk_order': row.get('chunk_order'),
-                        'start_line': row.get('start_line'),
-                        'end_line': row.get('end_line'),
-                        'similarity': float(row.get('similarity') or 0.0)  # Handle None case
-                    })
-                
-                return similar_chunks
+                return self._to_chunk_results(results)
                 
         except Exception as e:
             print(f"Failed to search similar chunks: {e}")
@@ -482,7 +598,7 @@ class OpenAIService:
                 if not rows:
                     def _escape_like(term: str) -> str:
                         # Escape Postgres LIKE meta-chars ('%' and '_')
-                        return re.sub(r'([%_])', r'\\\1', term)
+                        return _LIKE_META_RE.sub(r'\\\1', term)
 
                     keywords  = [w.strip('()').lower()              # strip () and case-fold
                                  for w in query_text.split() if len(w) > 2][:5]
@@ -518,21 +634,7 @@ class OpenAIService:
                     params = [limit, repo_id] + patterns
                     rows = await db.query_raw(ilike_sql, *params)
 
-                chunks: List[Dict[str, Any]] = []
-                for row in rows:
-                    chunks.append({
-                        'hash': row.get('hash'),
-                        'content': row.get('content'),
-                        'token_count': row.get('token_count'),
-                        'file_id': row.get('file_id'),
-                        'file_path': row.get('file_path'),
-                        'storage_key': row.get('storage_key'),
-                        'chunk_order': row.get('chunk_order'),
-                        'start_line': row.get('start_line'),
-                        'end_line': row.get('end_line'),
-                        'similarity': float(row.get('similarity') or 0.0)
-                    })
-                return chunks
+                return self._to_chunk_results(rows)
         except Exception as e:
             print(f"Fallback full-text search failed: {e}")
             return []
@@ -138,17 +138,20 @@ class OperationApplier:
         Raises:
             OperationApplyError: If operation cannot be applied
         """
-        lines = content.splitlines()
+        # Normalize line endings once so anchors can match across lines
+        full_content = '\n'.join(content.splitlines())
         
         try:
-            if operation.op == OperationType.INSERT_AFTER:
-                return OperationApplier._apply_insert_after(lines, operation)
+            if not content and operation.op in (OperationType.INSERT_AFTER, OperationType.INSERT_BEFORE):
+                return OperationApplier._apply_insert_into_empty(operation)
+            elif operation.op == OperationType.INSERT_AFTER:
+                return OperationApplier._apply_insert_after(full_content, operation)
             elif operation.op == OperationType.INSERT_BEFORE:
-                return OperationApplier._apply_insert_before(lines, operation)
+                return OperationApplier._apply_insert_before(full_content, operation)
             elif operation.op == OperationType.REPLACE:
-                return OperationApplier._apply_replace(lines, operation)
+                return OperationApplier._apply_replace(full_content, operation)
             elif operation.op == OperationType.DELETE_BLOCK:
-                return OperationApplier._apply_delete_block(lines, operation)
+                return OperationApplier._apply_delete_block(full_content, operation)
             else:
                 raise OperationApplyError(f"Unknown operation type: {operation.op}")
         except Exception as e:
@@ -177,65 +180,54 @@ class OperationApplier:
         return result
 
     @staticmethod
-    def _apply_insert_after(lines: List[str], operation: Operation) -> str:
+    def _apply_insert_into_empty(operation: Operation) -> str:
+        """Apply an insert operation to an empty file, which has no line to splice next to"""
+        # Only an empty anchor matches an empty file
+        if operation.find:
+            raise OperationApplyError(f"Could not find anchor text: {operation.find}")
+        
+        # The inserted text becomes the whole file, with no separator added
+        return operation.insert
+
+    @staticmethod
+    def _apply_insert_after(full_content: str, operation: Operation) -> str:
         """Apply insertAfter operation"""
         find_text = operation.find
         insert_text = operation.insert
         
-        # Rejoin lines to search for multi-line patterns
-        full_content = '\n'.join(lines)
-        
-        # Check if find_text exists in the content
-        if find_text not in full_content:
-            raise OperationApplyError(f"Could not find anchor text: {find_text}")
-        
         # Find the position of the match
         match_start = full_content.find(find_text)
+        if match_start == -1:
+            raise OperationApplyError(f"Could not find anchor text: {find_text}")
         match_end = match_start + len(find_text)
         
-        # Find which line the match ends on
-        content_before_match_end = full_content[:match_end]
-        lines_before_match_end = content_before_match_end.split('\n')
-        target_line_idx = len(lines_before_match_end) - 1
-        
-        # Insert after the target line
-        lines.insert(target_line_idx + 1, insert_text)
-        return '\n'.join(lines)
+        # Insert after the line the match ends on
+        line_end = full_content.find('\n', match_end)
+        if line_end == -1:
+            return full_content + '\n' + insert_text
+        return full_content[:line_end] + '\n' + insert_text + full_content[line_end:]
 
     @staticmethod
-    def _apply_insert_before(lines: List[str], operation: Operation) -> str:
+    def _apply_insert_before(full_content: str, operation: Operation) -> str:
         """Apply insertBefore operation"""
         find_text = operation.find
         insert_text = operation.insert
         
-        # Rejoin lines to search for multi-line patterns
-        full_content = '\n'.join(lines)
-        
-        # Check if find_text exists in the content
-        if find_text not in full_content:
-            raise OperationApplyError(f"Could not find anchor text: {find_text}")
-        
         # Find the position of the match
         match_start = full_content.find(find_text)
+        if match_start == -1:
+            raise OperationApplyError(f"Could not find anchor text: {find_text}")
         
-        # Find which line the match starts on
-        content_before_match_start = full_content[:match_start]
-        lines_before_match_start = content_before_match_start.split('\n')
-        target_line_idx = len(lines_before_match_start) - 1
-        
-        # Insert before the target line
-        lines.insert(target_line_idx, insert_text)
-        return '\n'.join(lines)
+        # Insert before the line the match starts on
+        line_start = full_content.rfind('\n', 0, match_start) + 1
+        return full_content[:line_start] + insert_text + '\n' + full_content[line_start:]
 
     @staticmethod
-    def _apply_replace(lines: List[str], operation: Operation) -> str:
+    def _apply_replace(full_content: str, operation: Operation) -> str:
         """Apply replace operation"""
         find_text = operation.find
         replace_text = operation.replace
         
-        # Rejoin lines to search for multi-line patterns
-        full_content = '\n'.join(lines)
-        
         # Check if find_text exists in the content
         if find_text not in full_content:
             raise OperationApplyError(f"Could not find text to replace: {find_text}")
@@ -245,14 +237,11 @@ class OperationApplier:
         return modified_content
 
     @staticmethod
-    def _apply_delete_block(lines: List[str], operation: Operation) -> str:
+    def _apply_delete_block(full_content: str, operation: Operation) -> str:
         """Apply deleteBlock operation"""
         find_text = operation.find
         until_text = operation.until
         
-        # Rejoin lines to search for multi-line patterns
-        full_content = '\n'.join(lines)
-        
         # Find the start and end positions
         start_pos = full_content.find(find_text)
         if start_pos == -1:
@@ -2,6 +2,7 @@
 Storage service for handling document and file operations
 """
 
+import asyncio
 from typing import List, Dict, Any, Optional
 from .supabase_client import supabase_client
 
@@ -131,7 +132,8 @@ class StorageService:
         Returns:
             File content as a string or None if failed
         """
-        content = supabase_client.download_file(bucket=bucket, path=path)
+        # The Supabase client is synchronous; keep the download off the event loop
+        content = await asyncio.to_thread(supabase_client.download_file, bucket=bucket, path=path)
         if content:
             try:
                 return content.decode('utf-8')
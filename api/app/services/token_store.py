@@ -0,0 +1,105 @@
+"""
+Short-lived Redis storage for GitHub access tokens handed to Celery tasks
+"""
+
+import logging
+import uuid
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class GitHubTokenStore:
+    """
+    Keeps GitHub access tokens out of Celery messages
+
+    The API stores the token under a random key and dispatches only the key;
+    the worker resolves it when the task runs. Keys expire on their own so an
+    abandoned task never leaves a token behind for long.
+    """
+
+    KEY_PREFIX = "gh_tok:"
+    TTL_SECONDS = 3600
+
+    def __init__(self, redis_url: str):
+        self._redis_url = redis_url
+        self._async_client: Optional[aioredis.Redis] = None
+        self._sync_client: Optional[redis.Redis] = None
+
+    @property
+    def async_client(self) -> aioredis.Redis:
+        """Redis client for the API event loop"""
+        if self._async_client is None:
+            self._async_client = aioredis.from_url(self._redis_url, decode_responses=True)
+        return self._async_client
+
+    @property
+    def sync_client(self) -> redis.Redis:
+        """Redis client for Celery workers, which run each task in a fresh event loop"""
+        if self._sync_client is None:
+            self._sync_client = redis.Redis.from_url(self._redis_url, decode_responses=True)
+        return self._sync_client
+
+    async def stash(self, token: Optional[str]) -> Optional[str]:
+        """
+        Store a token and return the key referencing it
+
+        Args:
+            token: GitHub access token (may be None for public repositories)
+
+        Returns:
+            Redis key for the token, or None if there is no token
+        """
+        if not token:
+            return None
+
+        key = f"{self.KEY_PREFIX}{uuid.uuid4().hex}"
+        await self.async_client.setex(key, self.TTL_SECONDS, token)
+        return key
+
+    def fetch(self, key: Optional[str]) -> Optional[str]:
+        """
+        Resolve a token key
+
+        Args:
+            key: Key returned by stash()
+
+        Returns:
+            The token, or None if the key is missing or has expired
+        """
+        if not key:
+            return None
+
+        token = self.sync_client.get(key)
+        if token is None:
+            logger.warning(f"GitHub token key {key} not found or expired")
+        return token
+
+    async def discard_async(self, key: Optional[str]) -> None:
+        """Delete a token key from the API event loop, e.g. when dispatch fails"""
+        if not key:
+            return
+
+        try:
+            await self.async_client.delete(key)
+        except Exception as e:
+            logger.warning(f"Failed to delete GitHub token key {key}: {e}")
+
+    def discard(self, key: Optional[str]) -> None:
+        """Delete a token key once the task no longer needs it"""
+        if not key:
+            return
+
+        try:
+            self.sync_client.delete(key)
+        except Exception as e:
+            logger.warning(f"Failed to delete GitHub token key {key}: {e}")
+
+
+# Global token store instance
+github_token_store = GitHubTokenStore(settings.REDIS_URL)
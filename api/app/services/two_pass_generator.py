@@ -174,7 +174,7 @@ class FileSelector:
     async def _get_relevant_chunks(self, query: str) -> List[Dict[str, Any]]:
         """Get relevant chunks using elbow method for dynamic retrieval"""
         # Generate query embedding
-        query_embedding = await self.openai_service.generate_embedding_with_retry(query)
+        query_embedding = await self.openai_service.generate_query_embedding(query)
         if not query_embedding:
             logger.error("Pass 1: Failed to generate query embedding")
             return []
@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
 from pathlib import Path
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -24,10 +25,22 @@ class Settings(BaseSettings):
     allowed_origins: list[str] = ["*"]
     
     REDIS_URL: str
+    # Broker connections kept open for publishing tasks; size it to the
+    # number of requests that may dispatch Celery tasks concurrently
+    celery_broker_pool_limit: int = 10
     
     DATABASE_URL: str
     DIRECT_URL: str
     
+    # Prisma connection pool configuration
+    # When unset, the connection limit is derived from the CPU count and the
+    # number of uvicorn workers sharing the database
+    db_connection_limit: Optional[int] = None
+    db_pool_timeout: int = 20  # Seconds to wait for a free pooled connection
+    db_connect_timeout: int = 10  # Seconds to wait when opening a new connection
+    db_pgbouncer: bool = False  # Set when connecting through PgBouncer in transaction mode
+    web_concurrency: int = 1  # Number of uvicorn worker processes
+    
     # OpenAI configuration
     OPENAI_API_KEY: str
     
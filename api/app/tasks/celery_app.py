@@ -22,6 +22,7 @@ celery_app.conf.update(
     result_backend_always_retry=True,  # Always retry result backend
     result_backend_max_retries=10,  # Max retries for result backend
     task_acks_late=True,  # Acknowledge tasks after completion
+    broker_pool_limit=settings.celery_broker_pool_limit,  # Publisher connections shared by API requests
     worker_prefetch_multiplier=1,  # Process one task at a time
     
     # CRITICAL: Memory management settings to prevent double free errors
@@ -15,6 +15,7 @@ from celery import current_task
 from app.tasks.celery_app import celery_app
 from app.database import prisma
 from app.services.indexing_orchestrator import IndexingOrchestrator
+from app.services.token_store import github_token_store
 
 logger = logging.getLogger(__name__)
 
@@ -57,8 +58,12 @@ def process_indexing(
     github_full_name: str,
     branch: str,
     docs_directory: str,
+    # Only for messages queued before tokens moved to the token store; new
+    # dispatches pass github_token_key so tokens never sit in the broker
     github_access_token: str = None,
-    soft_reindex: bool = False
+    soft_reindex: bool = False,
+    github_token_key: str = None,
+    force_reembed: bool = False
 ):
     """
     Main indexing task that performs complete repository documentation indexing.
@@ -78,8 +83,10 @@ def process_indexing(
         github_full_name: GitHub repository name (e.g., "owner/repo")
         branch: Git branch to index
         docs_directory: Directory containing documentation files
-        github_access_token: Optional GitHub access token for private repos
+        github_access_token: Raw GitHub token, accepted only from messages queued before github_token_key
         soft_reindex: Whether to perform soft reindex (skip cloning, use existing files)
+        github_token_key: Optional token store key to resolve the access token from
+        force_reembed: Re-embed even if the commit and files match the last sync
         
     Returns:
         Dict with indexing results and statistics
@@ -88,10 +95,14 @@ def process_indexing(
         # Restore stdout/stderr for proper library compatibility
         _restore_std_streams()
         
+        # Resolve the access token passed by reference
+        if github_token_key:
+            github_access_token = github_token_store.fetch(github_token_key)
+        
         # Run the async indexing workflow
         result = asyncio.run(_run_indexing_workflow(
             self, repo_id, user_id, github_full_name, branch, 
-            docs_directory, github_access_token, soft_reindex
+            docs_directory, github_access_token, soft_reindex, force_reembed
         ))
         
         return result
@@ -109,6 +120,9 @@ def process_indexing(
             "error": str(e),
             "repo_id": repo_id,
         }
+    
+    finally:
+        github_token_store.discard(github_token_key)
 
 
 async def _run_indexing_workflow(
@@ -119,7 +133,8 @@ async def _run_indexing_workflow(
     branch: str,
     docs_directory: str,
     github_access_token: str = None,
-    soft_reindex: bool = False
+    soft_reindex: bool = False,
+    force_reembed: bool = False
 ):
     """
     Internal async function that runs the complete indexing workflow
@@ -133,6 +148,7 @@ async def _run_indexing_workflow(
         docs_directory: Directory containing documentation files
         github_access_token: Optional GitHub access token
         soft_reindex: Whether to perform soft reindex
+        force_reembed: Re-embed even if the commit and files match the last sync
         
     Returns:
         Dict with indexing results
@@ -157,7 +173,8 @@ async def _run_indexing_workflow(
             branch=branch,
             docs_directory=docs_directory,
             github_access_token=github_access_token,
-            soft_reindex=soft_reindex
+            soft_reindex=soft_reindex,
+            force_reembed=force_reembed
         )
         
         logger.info(f"Indexing workflow completed: {result['status']}")
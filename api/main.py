@@ -1,6 +1,7 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.settings import settings
 from app.endpoints import health_router, query_router, index_router
@@ -9,7 +10,7 @@ from app.database import connect_db, disconnect_db
 # Application lifespan handler
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup logic
+    # Startup logic: a single Prisma client connection shared by all requests
     await connect_db()
 
     # Application is now live
@@ -24,6 +25,7 @@ app = FastAPI(
     version=settings.app_version,
     debug=settings.debug,
     description="A modern API for document acceleration and management",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -0,0 +1,51 @@
+"""
+Tests for applying operations to file content
+"""
+
+import pytest
+
+from app.services.operations_parser import (
+    Operation,
+    OperationApplier,
+    OperationApplyError,
+    OperationType,
+)
+
+
+@pytest.mark.parametrize("op", [OperationType.INSERT_AFTER, OperationType.INSERT_BEFORE])
+def test_insert_into_empty_file_with_empty_anchor(op):
+    operation = Operation(file="docs/empty.md", op=op, find="", insert="INS\nX")
+
+    assert OperationApplier.apply_operation_to_content("", operation) == "INS\nX"
+
+
+@pytest.mark.parametrize("op", [OperationType.INSERT_AFTER, OperationType.INSERT_BEFORE])
+def test_insert_into_empty_file_with_missing_anchor(op):
+    operation = Operation(file="docs/empty.md", op=op, find="missing", insert="INS")
+
+    with pytest.raises(OperationApplyError):
+        OperationApplier.apply_operation_to_content("", operation)
+
+
+def test_insert_after_blank_line_file():
+    operation = Operation(file="docs/blank.md", op=OperationType.INSERT_AFTER, find="", insert="INS")
+
+    assert OperationApplier.apply_operation_to_content("\n", operation) == "\nINS"
+
+
+def test_insert_before_blank_line_file():
+    operation = Operation(file="docs/blank.md", op=OperationType.INSERT_BEFORE, find="", insert="INS")
+
+    assert OperationApplier.apply_operation_to_content("\n", operation) == "INS\n"
+
+
+def test_insert_after_anchor_line():
+    operation = Operation(file="docs/a.md", op=OperationType.INSERT_AFTER, find="two", insert="INS")
+
+    assert OperationApplier.apply_operation_to_content("one\ntwo\nthree", operation) == "one\ntwo\nINS\nthree"
+
+
+def test_insert_before_anchor_line():
+    operation = Operation(file="docs/a.md", op=OperationType.INSERT_BEFORE, find="two", insert="INS")
+
+    assert OperationApplier.apply_operation_to_content("one\ntwo\nthree", operation) == "one\nINS\ntwo\nthree"